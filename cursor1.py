@@ -1,69 +1,176 @@
-import requests
-import random
-import string
+import aiohttp
+import asyncio
 import json
 import os
 import time
-import threading
-from concurrent.futures import ThreadPoolExecutor
+import atexit
+from collections import deque
 from colorama import init, Fore
 import re
 
 # 初始化 colorama
 init()
 
-VALID_CODES_FILE = "valid_codes.txt"  # 有效兑换码文件
+VALID_CODES_FILE = "valid_codes.txt"  # 有效兑换码文件（每行一条 JSON 记录）
 CHECKED_CODES_FILE = "checked_codes.txt"  # 已检测兑换码文件
 LAST_CODE_FILE = "last_code.txt"  # 记录最后一个检测的兑换码
+FLUSH_INTERVAL = 2  # 已检测兑换码落盘间隔（秒）
+FLUSH_BATCH_SIZE = 64  # 缓冲达到该数量时立即落盘
+MAX_CONCURRENCY = 32  # 最大并发检测数，不超过连接池的 limit_per_host
 
-# 用于线程同步
-lock = threading.Lock()
+# 模拟浏览器访问时使用的请求头
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8",
+    "Accept-Language": "zh-CN,zh;q=0.9,en;q=0.8",
+    "Accept-Encoding": "gzip, deflate, br",
+    "Connection": "keep-alive",
+    "Upgrade-Insecure-Requests": "1"
+}
+
+# 检测时访问的邀请页面地址
+REFERRAL_URL_TEMPLATE = "https://cursor.com/cn/referral?code=%s"
+
+# 邀请链接，捕获组为邀请码
+URL_CODE_RE = re.compile(r"https://cursor\.com/referral\?code=([A-Z0-9]+)")
+
+# 页面中表示邀请码无效的标记，一次扫描完成匹配；标记均为 ASCII，直接在字节流上匹配
+INVALID_MARKERS_RE = re.compile(
+    rb"invalid referral code|referral code is invalid|referral code has expired|referral code not found",
+    re.IGNORECASE
+)
+MARKER_OVERLAP = 32  # 分块扫描时保留的重叠字节数，不小于最长标记长度
+READ_CHUNK_SIZE = 8192
+
+class AIMDLimiter:
+    """加性增、乘性减的并发控制器
+
+    遇到 429/5xx 时并发数减半并按 Retry-After 暂停，
+    最近请求的平均延迟低于目标值时并发数加一。
+    """
+
+    def __init__(self, initial=8, minimum=2, maximum=32, target_latency=1.5, window=16):
+        self.limit = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target_latency = target_latency
+        self.latencies = deque(maxlen=window)
+        self.in_flight = 0
+        self.pause_until = 0.0
+        self.cond = asyncio.Condition()
+
+    async def __aenter__(self):
+        async with self.cond:
+            while True:
+                wait = self.pause_until - time.monotonic()
+                if wait > 0:
+                    try:
+                        await asyncio.wait_for(self.cond.wait(), wait)
+                    except asyncio.TimeoutError:
+                        pass
+                elif self.in_flight >= self.limit:
+                    await self.cond.wait()
+                else:
+                    break
+            self.in_flight += 1
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        async with self.cond:
+            self.in_flight -= 1
+            self.cond.notify_all()
+        return False
+
+    async def record(self, status_code, latency, retry_after=None):
+        """根据响应结果调整并发数"""
+        async with self.cond:
+            if status_code is None or status_code == 429 or status_code >= 500:
+                self.limit = max(self.minimum, int(self.limit * 0.5))
+                self.latencies.clear()
+                try:
+                    delay = int(retry_after) if retry_after else 1
+                except ValueError:
+                    delay = 1
+                self.pause_until = max(self.pause_until, time.monotonic() + delay)
+            else:
+                self.latencies.append(latency)
+                if (len(self.latencies) == self.latencies.maxlen
+                        and sum(self.latencies) / len(self.latencies) <= self.target_latency):
+                    self.limit = min(self.maximum, self.limit + 1)
+                    self.latencies.clear()
+            self.cond.notify_all()
+
+
+# 检测在单个事件循环中进行，以下状态只在循环线程内修改
 checked_codes = set()  # 已检测的兑换码集合
 total_checks = 0  # 检测总数
 valid_count = 0  # 有效兑换码数量
-
-def extract_code_from_url(url):
-    """从URL中提取邀请码"""
-    try:
-        code = url.split('code=')[1].split(')')[0].split(']')[0]
-        return code
-    except:
-        return None
+_pending = []  # 待写入文件的已检测兑换码
+_valid_file = None  # 有效兑换码文件句柄，首次写入时打开
 
 def load_checked_codes():
     """加载已检测的兑换码"""
     global checked_codes
     if os.path.exists(CHECKED_CODES_FILE):
         with open(CHECKED_CODES_FILE, "r", encoding="utf-8") as f:
-            for line in f:
-                code = line.strip()
-                if code:
-                    checked_codes.add(code)
+            checked_codes.update(line.strip() for line in f.read().splitlines())
+        checked_codes.discard("")
     print(f"已加载 {len(checked_codes)} 个已检测的兑换码")
 
-def save_checked_code(code, is_valid, result=None):
+def flush_checked_codes():
+    """将缓冲中的已检测兑换码批量写入文件"""
+    if not _pending:
+        return
+    batch = _pending[:]
+    _pending.clear()
+    with open(CHECKED_CODES_FILE, "a", encoding="utf-8") as f:
+        f.write("\n".join(batch) + "\n")
+    # 保存最后检测的兑换码
+    with open(LAST_CODE_FILE, "w", encoding="utf-8") as f:
+        f.write(batch[-1])
+
+async def _flusher(flush_event):
+    """后台定期落盘，缓冲满时提前唤醒"""
+    while True:
+        try:
+            await asyncio.wait_for(flush_event.wait(), FLUSH_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+        flush_event.clear()
+        flush_checked_codes()
+
+atexit.register(flush_checked_codes)
+
+def save_checked_code(code, is_valid, result=None, flush_event=None):
     """保存已检测的兑换码"""
-    with lock:
-        # 添加到内存集合
-        checked_codes.add(code)
-        # 添加到已检测文件
-        with open(CHECKED_CODES_FILE, "a", encoding="utf-8") as f:
-            f.write(f"{code}\n")
-        # 保存最后检测的兑换码
-        with open(LAST_CODE_FILE, "w", encoding="utf-8") as f:
-            f.write(code)
-        # 如果有效，保存到有效兑换码文件
-        if is_valid and result:
-            save_valid_code(code, result)
+    # 添加到内存集合
+    checked_codes.add(code)
+    # 加入待写入缓冲，由后台任务批量落盘
+    _pending.append(code)
+    if flush_event is not None and len(_pending) >= FLUSH_BATCH_SIZE:
+        flush_event.set()
+    # 如果有效，保存到有效兑换码文件
+    if is_valid and result:
+        save_valid_code(code, result)
 
 def save_valid_code(code, result):
-    """保存有效的兑换码"""
-    with open(VALID_CODES_FILE, "a", encoding="utf-8") as f:
-        f.write(f"优惠码: {code}\n")
-        f.write(f"结果: {json.dumps(result, indent=2, ensure_ascii=False)}\n")
-        f.write("-" * 50 + "\n")
+    """保存有效的兑换码，每个兑换码追加一行 JSON"""
+    global _valid_file
+    if _valid_file is None:
+        _valid_file = open(VALID_CODES_FILE, "a", buffering=1, encoding="utf-8")
+        atexit.register(_valid_file.close)
+    _valid_file.write(json.dumps({"code": code, **result}, ensure_ascii=False) + "\n")
 
-def check_code(code):
+async def contains_invalid_marker(response):
+    """分块读取响应体，一旦发现无效标记立即停止读取"""
+    tail = b""
+    async for chunk in response.content.iter_chunked(READ_CHUNK_SIZE):
+        if INVALID_MARKERS_RE.search(tail + chunk):
+            return True
+        tail = chunk[-MARKER_OVERLAP:]
+    return False
+
+async def check_code(session, limiter, code, flush_event=None):
     """检测优惠码是否有效"""
     global total_checks, valid_count
 
@@ -71,84 +178,90 @@ def check_code(code):
     if code in checked_codes:
         return False, code, None
 
-    # 模拟浏览器访问邀请链接
-    url = f"https://cursor.com/cn/referral?code={code}"
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
-        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8",
-        "Accept-Language": "zh-CN,zh;q=0.9,en;q=0.8",
-        "Accept-Encoding": "gzip, deflate, br",
-        "Connection": "keep-alive",
-        "Upgrade-Insecure-Requests": "1"
-    }
+    # 模拟浏览器访问邀请链接，请求头已在会话上统一设置
+    url = REFERRAL_URL_TEMPLATE % code
 
     try:
-        # 访问邀请链接
-        response = requests.get(url, headers=headers, allow_redirects=True)
-        
-        # 检查响应内容
-        content = response.text.lower()  # 转换为小写以进行不区分大小写的检查
-        
-        # 检查是否包含无效标记
-        is_invalid = any([
-            "invalid referral code" in content,
-            "referral code is invalid" in content,
-            "referral code has expired" in content,
-            "referral code not found" in content
-        ])
-        
+        # 访问邀请链接，并发数由 limiter 控制
+        async with limiter:
+            start = time.monotonic()
+            try:
+                async with session.get(url, allow_redirects=True) as response:
+                    status_code = response.status
+                    final_url = str(response.url)
+                    retry_after = response.headers.get("Retry-After")
+                    throttled = status_code == 429 or status_code >= 500
+                    is_invalid = False if throttled else await contains_invalid_marker(response)
+            except Exception:
+                await limiter.record(None, time.monotonic() - start)
+                raise
+            await limiter.record(status_code, time.monotonic() - start, retry_after)
+
+        # 被限流或服务端错误时不记录为已检测，下次运行可重试
+        if throttled:
+            print(f"优惠码 ---- {code} ---- 状态码 {status_code} ---- 被限流，稍后重试")
+            return False, code, None
+
         is_valid = not is_invalid
         
         result = {
-            "status_code": response.status_code,
-            "url": response.url,
+            "status_code": status_code,
+            "url": final_url,
             "is_valid": is_valid,
             "content_check": "包含无效标记" if is_invalid else "未发现无效标记"
         }
 
-        with lock:
-            total_checks += 1
-            if is_valid:
-                valid_count += 1
+        total_checks += 1
+        if is_valid:
+            valid_count += 1
 
         color = Fore.GREEN if is_valid else Fore.RED
-        print(f"[{total_checks}] 优惠码 ---- {code} ---- 状态码 {response.status_code} ---- 有效性: {color}{is_valid}{Fore.RESET}")
+        print(f"[{total_checks}] 优惠码 ---- {code} ---- 状态码 {status_code} ---- 有效性: {color}{is_valid}{Fore.RESET}")
 
         # 保存检测结果
-        save_checked_code(code, is_valid, result)
+        save_checked_code(code, is_valid, result, flush_event)
         return is_valid, code, result
     except Exception as e:
         print(f"优惠码 ---- {code} ---- 检测失败: {str(e)}")
         return False, code, None
 
+async def check_codes(codes):
+    """在单个事件循环中并发检测兑换码"""
+    limiter = AIMDLimiter(maximum=MAX_CONCURRENCY)
+    flush_event = asyncio.Event()
+    flusher = asyncio.create_task(_flusher(flush_event))
+    connector = aiohttp.TCPConnector(limit=64, limit_per_host=MAX_CONCURRENCY)
+    timeout = aiohttp.ClientTimeout(total=10, connect=3)
+    try:
+        async with aiohttp.ClientSession(headers=HEADERS, connector=connector, timeout=timeout) as session:
+            await asyncio.gather(*(check_code(session, limiter, code, flush_event) for code in codes))
+    finally:
+        flusher.cancel()
+        flush_checked_codes()
+
 def check_codes_from_file(file_path):
     """从文件中读取并检查邀请码"""
     print("开始从文件中检查邀请码...")
     print("=" * 60)
     
-    # 确保输出文件存在
-    if not os.path.exists(VALID_CODES_FILE):
-        with open(VALID_CODES_FILE, "w", encoding="utf-8") as f:
-            f.write("有效的优惠码列表:\n")
-    
     # 加载已检测的兑换码
     load_checked_codes()
     
     # 读取文件中的邀请码
     with open(file_path, 'r', encoding='utf-8') as f:
         content = f.read()
-        # 使用正则表达式匹配所有邀请码
-        urls = re.findall(r'https://cursor\.com/referral\?code=[A-Z0-9]+', content)
-        
-        total_codes = len(urls)
-        print(f"从文件中找到 {total_codes} 个邀请码")
-        
-        for url in urls:
-            code = extract_code_from_url(url)
-            if code:
-                check_code(code)
-                time.sleep(random.uniform(0.3, 0.8))  # 添加随机延迟
-    
+
+    # 一次正则匹配直接得到所有邀请码
+    found_codes = URL_CODE_RE.findall(content)
+    print(f"从文件中找到 {len(found_codes)} 个邀请码")
+
+    # 去重并过滤掉已检测过的兑换码，只提交新的兑换码
+    codes = set(found_codes) - checked_codes
+    print(f"其中 {len(codes)} 个为未检测的新邀请码")
+
+    # 使用 asyncio 并发检测，并发数由 AIMDLimiter 控制
+    asyncio.run(check_codes(codes))
+
     print(f"\n检测完成。共检查了 {total_checks} 个兑换码，找到 {valid_count} 个有效码")
     print(f"有效推荐码保存在: {VALID_CODES_FILE}")
     print(f"已检测兑换码保存在: {CHECKED_CODES_FILE}")
@@ -1,5 +1,6 @@
 import tomllib
 import os
+import re
 import asyncio
 import aiohttp
 from loguru import logger
@@ -10,12 +11,20 @@ from utils.plugin_base import PluginBase
 from database.XYBotDB import XYBotDB
 
 from .quark import QURAK
-from concurrent.futures import ThreadPoolExecutor
+from .ttl_cache import TTLCache
 from typing import List, Any
 import time
 import logging
 from datetime import datetime
 
+# 单个搜索源的最长等待时间（秒）
+SEARCH_TIMEOUT = 5
+# 搜索结果缓存的条目数和有效期（秒）
+RESULT_CACHE_SIZE = 512
+RESULT_CACHE_TTL = 300
+# 白名单状态缓存有效期（秒）
+WHITELIST_CACHE_TTL = 60
+
 
 class Quarkso(PluginBase):
     description = "夸克资源搜索"
@@ -38,9 +47,9 @@ class Quarkso(PluginBase):
             
             if "XYBot" not in config or "admins" not in config["XYBot"]:
                 logger.error("[Quarkso] 主配置文件中缺少 XYBot.admins 配置")
-                self.admins = []
+                self.admins = frozenset()
             else:
-                self.admins = config["XYBot"]["admins"]
+                self.admins = frozenset(config["XYBot"]["admins"])
             
             # 读取插件配置
             plugin_config_path = "plugins/Quarkso/config.toml"
@@ -59,6 +68,9 @@ class Quarkso(PluginBase):
             self.enable = config.get("enable", True)
             filtered_commandAll = [item for item in config.get("commandAll", []) if item and item.strip()]
             self.command = config.get("command", ["外部搜索"]) + filtered_commandAll
+            # 按命令长度从长到短排序，保证优先匹配较长的命令
+            self.command.sort(key=len, reverse=True)
+            self._command_re = self._compile_command_re(self.command)
             self.commandAll = 1 if filtered_commandAll else 0
             self.command_format = config.get("command-format", "搜索指令：\n外部搜索+资源名称")
             
@@ -66,6 +78,14 @@ class Quarkso(PluginBase):
             self.admin_ignore = config.get("admin_ignore", False)
             self.whitelist_ignore = config.get("whitelist_ignore", False)
             self.default_type = config.get("default_type", "QUARK")  # 新增默认资源类型配置
+
+            # 所有搜索共用一个 QURAK 实例，其中的连接池、进行中任务和锁都绑定当前事件循环，只能在该循环上使用
+            self._quark = QURAK()
+            # 相同关键字短时间内重复搜索时直接返回缓存结果
+            self._result_cache = TTLCache(maxsize=RESULT_CACHE_SIZE, ttl=RESULT_CACHE_TTL)
+            self._whitelist_cache = TTLCache(maxsize=1024, ttl=WHITELIST_CACHE_TTL)
+            # 进行中的搜索，键与结果缓存相同
+            self._inflight = {}
             
             try:
                 self.db = XYBotDB()
@@ -79,13 +99,25 @@ class Quarkso(PluginBase):
             # 设置默认值，确保不会完全崩溃
             self.enable = False
             self.command = []
+            self._command_re = None
             self.commandAll = 0
             self.command_format = ""
             self.price = 0
             self.admin_ignore = False
             self.whitelist_ignore = False
             self.db = None
-            self.admins = []
+            self.admins = frozenset()
+            self._quark = QURAK()
+            self._result_cache = TTLCache(maxsize=RESULT_CACHE_SIZE, ttl=RESULT_CACHE_TTL)
+            self._whitelist_cache = TTLCache(maxsize=1024, ttl=WHITELIST_CACHE_TTL)
+            self._inflight = {}
+
+    @staticmethod
+    def _compile_command_re(commands):
+        """将命令列表编译为一个前缀正则，命令需已按长度降序排列"""
+        if not commands:
+            return None
+        return re.compile("|".join(map(re.escape, commands)))
 
     @on_text_message
     async def handle_text(self, bot: WechatAPIClient, message: dict):
@@ -96,19 +128,13 @@ class Quarkso(PluginBase):
             content = str(message["Content"]).strip()
             logger.debug(f"[Quarkso] 收到消息: {content}")
             
-            # 按命令长度从长到短排序
-            self.command.sort(key=len, reverse=True)
-            
             # 检查消息是否以 command 中的任意一个开头
-            matched_command = None
-            for cmd in self.command:
-                if content.startswith(cmd):
-                    matched_command = cmd
-                    break
+            match = self._command_re.match(content) if self._command_re else None
             
             # 如果不以 command 中的任意一个开头，直接 return
-            if not matched_command:
+            if not match:
                 return
+            matched_command = match.group(0)
                 
             logger.info(f"[Quarkso] 匹配到命令: {matched_command}")
             
@@ -133,7 +159,7 @@ class Quarkso(PluginBase):
             
             if await self._check_point(bot, message):
                 await bot.send_text_message(message["FromWxid"], f"正在搜索，请稍等...", [message["SenderWxid"]])
-                response_data = self.merge_qry_data(processed_content, search_type)
+                response_data = await self.merge_qry_data(processed_content, search_type)
                 await self.send_final_reply(bot, message, response_data, search_type)
         except Exception as e:
             logger.error(f"[Quarkso] 处理消息异常: {e}")
@@ -152,9 +178,9 @@ class Quarkso(PluginBase):
 
                 if self.db is not None and not (message["SenderWxid"] in self.admins and self.admin_ignore):
                     try:
-                        is_whitelist = self.db.get_whitelist(message["SenderWxid"]) and self.whitelist_ignore
+                        is_whitelist = await self._is_whitelisted(message["SenderWxid"]) and self.whitelist_ignore
                         if not is_whitelist:
-                            self.db.add_points(message["SenderWxid"], self.price)
+                            await asyncio.to_thread(self.db.add_points, message["SenderWxid"], self.price)
                     except Exception as e:
                         logger.error(f"[Quarkso] 补偿积分异常: {e}")
             else:
@@ -171,24 +197,52 @@ class Quarkso(PluginBase):
             except Exception as send_err:
                 logger.error(f"[Quarkso] 发送错误消息失败: {send_err}")
 
-    def merge_qry_data(self, qry_key: str, search_type="QUARK"):
+    async def merge_qry_data(self, qry_key: str, search_type="QUARK"):
+        cache_key = (search_type, qry_key.strip().lower())
+        cached = self._result_cache.get(cache_key)
+        if cached is not None:
+            logger.info(f'[Quarkso] 命中搜索缓存: {qry_key}, 搜索类型: {search_type}')
+            return cached
+
+        # 相同关键字的搜索正在进行时，等待其结果而不是重复发起搜索
+        task = self._inflight.get(cache_key)
+        if task is None:
+            task = asyncio.create_task(self._search_and_cache(cache_key, qry_key, search_type))
+            self._inflight[cache_key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(cache_key, None))
+        else:
+            logger.info(f'[Quarkso] 合并进行中的相同搜索: {qry_key}, 搜索类型: {search_type}')
+        # shield 保证某个调用方被取消时不会连带取消共享的搜索
+        return await asyncio.shield(task)
+
+    async def _search_and_cache(self, cache_key, qry_key: str, search_type="QUARK"):
+        msg, found = await self._search(qry_key, search_type)
+        # 只缓存找到结果的搜索，未找到的关键字下次重新搜索
+        if found:
+            self._result_cache.set(cache_key, msg)
+        return msg
+
+    async def _search(self, qry_key: str, search_type="QUARK"):
+        """执行实际搜索，返回 (回复内容, 是否找到结果)"""
         try:
-            def fetch_data(method_name: str, qry_key: str, search_type="QUARK") -> Any:
+            async def fetch_data(method_name: str, qry_key: str, search_type="QUARK", seen=None) -> Any:
                 try:
-                    quark = QURAK()
-                    method = getattr(quark, method_name, None)
+                    method = getattr(self._quark, method_name, None)
                     if method is not None:
                         # 如果是瓦力搜索方法，传入搜索类型参数
                         if method_name in ["get_waliso_search", "get_qry_external_4"]:
-                            return method(qry_key, search_type)
+                            return await asyncio.wait_for(method(qry_key, search_type), SEARCH_TIMEOUT)
                         # 如果搜索百度云且有对应方法，使用百度云搜索方法
                         elif search_type == "BDY" and method_name == "get_baidu_search":
-                            return method(qry_key)
+                            return await asyncio.wait_for(method(qry_key), SEARCH_TIMEOUT)
                         # 如果搜索夸克，使用夸克相关方法
                         elif search_type == "QUARK":
-                            return method(qry_key)
+                            return await asyncio.wait_for(method(qry_key, seen=seen), SEARCH_TIMEOUT)
                         return None
                     return None
+                except asyncio.TimeoutError:
+                    logger.warning(f"[Quarkso] 执行方法 {method_name} 超时，跳过")
+                    return None
                 except Exception as e:
                     logger.error(f"[Quarkso] 执行方法 {method_name} 异常: {e}")
                     return None
@@ -202,12 +256,10 @@ class Quarkso(PluginBase):
             # 首先尝试使用瓦力搜索
             try:
                 logger.info(f'[Quarkso] 尝试使用瓦力搜索，类型: {search_type}...')
-                quark = QURAK()
-                
                 if search_type == "BDY":
-                    waliso_results = quark.get_baidu_search(qry_key)
+                    waliso_results = await self._quark.get_baidu_search(qry_key)
                 else:
-                    waliso_results = quark.get_waliso_search(qry_key)
+                    waliso_results = await self._quark.get_waliso_search(qry_key)
                 
                 # 如果瓦力搜索找到了结果，直接返回
                 if waliso_results and len(waliso_results) > 0:
@@ -218,17 +270,17 @@ class Quarkso(PluginBase):
                     for item in waliso_results:
                         if i > 5:
                             break
-                        item['sno'] = i
+                        item.sno = i
                         msg += '========== \n'
-                        title = item.get('title', '未知标题')
-                        url = item.get('url', '')
+                        title = item.title or '未知标题'
+                        url = item.url
                         msg += f"{i}.{title}\n{url}\n"
                         i += 1
                         
                     end_time = time.time()
                     execution_time = end_time - start_time
                     logger.info(f"[Quarkso] 瓦力搜索耗时: {execution_time:.6f} seconds")
-                    return msg
+                    return msg, True
                 
                 logger.info(f'[Quarkso] 瓦力搜索未找到结果，尝试其他来源...')
             except Exception as e:
@@ -239,55 +291,59 @@ class Quarkso(PluginBase):
                 end_time = time.time()
                 execution_time = end_time - start_time
                 logger.info(f"[Quarkso] 百度云搜索耗时: {execution_time:.6f} seconds")
-                return msg
+                return msg, False
             
             # 如果是夸克搜索且瓦力搜索失败或未找到结果，尝试使用其他搜索源
+            seen_url = set()
+            # 创建一个新的列表来存储去重后的数据
+            unique_data = []
+            i = 1
+            # 各搜索源共享的 pwd_id 集合，同一资源只返回一次
+            seen_pwd_ids = set()
+            # 在事件循环上并发查询各搜索源，按完成先后合并结果
+            tasks = [
+                asyncio.create_task(fetch_data(method_name, qry_key, seen=seen_pwd_ids))
+                for method_name in [
+                    'qry_kkkob',
+                    'get_qry_external',
+                    'get_qry_external_2',
+                    'get_qry_external_3',
+                    'get_qry_external_5'
+                ]
+            ]
             try:
-                with ThreadPoolExecutor() as executor:
-                    futures = [
-                        executor.submit(fetch_data, method_name, qry_key)
-                        for method_name in [
-                            'qry_kkkob',
-                            'get_qry_external',
-                            'get_qry_external_2',
-                            'get_qry_external_3',
-                            'get_qry_external_5'
-                        ]
-                    ]
-
-                # 使用列表推导式来获取每个 Future 的结果
-                seen_url = set()
-                # 创建一个新的列表来存储去重后的数据
-                unique_data = []
-
-                i = 1
-                # 遍历合并后的数据，按链接去重
-                for future in futures:
-                    future_data = future.result()
+                # 遍历合并后的数据，按链接去重，凑满5条后不再等待其余搜索源
+                for next_done in asyncio.as_completed(tasks, timeout=SEARCH_TIMEOUT):
+                    if i > 5:
+                        break
+                    future_data = await next_done
                     if future_data is not None:
                         for item in future_data:
                             if i > 5:
                                 break
-                            if 'url' not in item:
-                                logger.warning(f"[Quarkso] 数据项缺少 url 字段: {item}")
-                                continue
-                                
-                            url = item['url']
+                            url = item.url
                             if not url:
                                 continue
                                 
                             if url not in seen_url:
-                                item['sno'] = i
+                                item.sno = i
                                 seen_url.add(url)
                                 unique_data.append(item)
 
                                 msg += '========== \n'
-                                title = item.get('title', '未知标题')
-                                msg += f"{item['sno']}.{title}\n{url}\n"
+                                title = item.title or '未知标题'
+                                msg += f"{item.sno}.{title}\n{url}\n"
 
                                 i += 1
+            except asyncio.TimeoutError:
+                logger.warning(f"[Quarkso] 部分搜索源超时，返回已获取的 {i-1} 个结果")
             except Exception as e:
                 logger.error(f"[Quarkso] 合并查询结果异常: {e}")
+            finally:
+                # 取消仍未完成的搜索源
+                for task in tasks:
+                    if not task.done():
+                        task.cancel()
                 
             end_time = time.time()
             execution_time = end_time - start_time
@@ -295,13 +351,25 @@ class Quarkso(PluginBase):
             
             if i > 1:  # 表示找到了结果
                 logger.info(f"[Quarkso] 查询找到 {i-1} 个结果")
-                return msg
+                return msg, True
             else:
                 logger.info(f"[Quarkso] 未找到搜索结果")
-                return ""
+                return "", False
         except Exception as e:
             logger.error(f"[Quarkso] merge_qry_data 方法异常: {e}")
-            return ""
+            return "", False
+
+    async def on_disable(self):
+        await self._quark.close()
+        await super().on_disable()
+
+    async def _is_whitelisted(self, wxid: str) -> bool:
+        """查询白名单状态，数据库调用放到线程中执行并短暂缓存结果"""
+        is_whitelist = self._whitelist_cache.get(wxid)
+        if is_whitelist is None:
+            is_whitelist = bool(await asyncio.to_thread(self.db.get_whitelist, wxid))
+            self._whitelist_cache.set(wxid, is_whitelist)
+        return is_whitelist
 
     async def _check_point(self, bot: WechatAPIClient, message: dict) -> bool:
         try:
@@ -318,7 +386,7 @@ class Quarkso(PluginBase):
                 
             # 白名单检查
             try:
-                is_whitelist = self.db.get_whitelist(wxid) and self.whitelist_ignore
+                is_whitelist = await self._is_whitelisted(wxid) and self.whitelist_ignore
                 if is_whitelist:
                     return True
             except Exception as e:
@@ -331,14 +399,14 @@ class Quarkso(PluginBase):
                 
             # 积分检查
             try:
-                user_points = self.db.get_points(wxid)
+                user_points = await asyncio.to_thread(self.db.get_points, wxid)
                 if user_points < self.price:
                     await bot.send_at_message(message["FromWxid"], f"😭你的积分不够啦！需要 {self.price} 积分", [wxid])
                     await bot.send_text_message(message["FromWxid"], "你可以通过签到获取积分哦。", [wxid])
                     return False
                     
                 # 扣除积分
-                self.db.add_points(wxid, -self.price)
+                await asyncio.to_thread(self.db.add_points, wxid, -self.price)
                 return True
             except Exception as e:
                 logger.error(f"[Quarkso] 检查或扣除积分异常: {e}")
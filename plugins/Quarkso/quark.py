@@ -1,9 +1,36 @@
-import requests
+import aiohttp
+import asyncio
+import json
+import random
 import re
+import time
+from dataclasses import dataclass
+from functools import wraps
+from itertools import chain
+from types import MappingProxyType
+from urllib.parse import urlsplit
 import logging
 from loguru import logger
 
-quark_headers = {
+from .ttl_cache import TTLCache
+
+# 优先使用 orjson 解析/序列化 JSON，未安装时退回标准库
+try:
+    import orjson
+    json_loads = orjson.loads
+    json_dumps = lambda obj: orjson.dumps(obj).decode()
+except ImportError:
+    json_loads = json.loads
+    json_dumps = json.dumps
+
+# 安装了 msgspec 时，瓦力/cloudpan 的响应直接解码为结构体，省去中间的 dict/list
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+# 请求头在模块加载时构造并冻结，各请求直接共用，无需每次复制
+quark_headers = MappingProxyType({
     'sec-ch-ua': '"Not_A Brand";v="8", "Chromium";v="120", "Google Chrome";v="120"',
     'accept': 'application/json, text/plain, */*',
     'content-type': 'application/json',
@@ -17,9 +44,9 @@ quark_headers = {
     'referer': 'https://pan.quark.cn/',
     'accept-encoding': 'gzip, deflate, br',
     'accept-language': 'zh-CN,zh;q=0.9'
-}
+})
 
-waliso_headers = {
+waliso_headers = MappingProxyType({
     'accept': 'application/json, text/plain, */*',
     'accept-encoding': 'gzip, deflate, br, zstd',
     'accept-language': 'zh-CN,zh;q=0.9',
@@ -33,13 +60,24 @@ waliso_headers = {
     'sec-fetch-mode': 'cors',
     'sec-fetch-site': 'same-origin',
     'user-agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36'
-}
+})
+
+funletu_headers = MappingProxyType({
+    **quark_headers,
+    'origin': 'https://pan.funletu.com',
+    'referer': 'https://pan.funletu.com/'
+})
 
-kkkob_headers = {
+cloudpan_headers = MappingProxyType({
+    **quark_headers,
+    'origin': 'https://cloudpan.cn',
+    'referer': 'https://cloudpan.cn/'
+})
+
+kkkob_headers = MappingProxyType({
     'accept': '*/*',
     'accept-encoding': 'gzip, deflate',
     'accept-language': 'zh-CN,zh;q=0.9',
-    'content-length': '68',
     'content-type': 'application/x-www-form-urlencoded; charset=UTF-8',
     'user-agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
     'sec-ch-ua-platform': '"Windows"',
@@ -47,14 +85,223 @@ kkkob_headers = {
     'referer': 'http://z.kkkob.com/app/',
     'Proxy-Connection': 'keep-alive',
     'X-Requested-With': 'XMLHttpRequest'
-}
+})
+
+# 夸克分享链接：捕获 pwd_id 以及可选的子目录 pdir_fid
+_URL_ID_RE = re.compile(r"(?:https://pan\.quark\.cn/s/)?(\w+)(#/list/share.*/(\w+))?")
+QUARK_SHARE_PREFIX = "https://pan.quark.cn/s/"
+
+
+def _is_word(text: str) -> bool:
+    """text 非空且只含字母、数字或下划线，与正则 \\w+ 一致"""
+    return text.replace("_", "a").isalnum()
+
+
+# 匹配以 http(s):// 开头、包含 pan.quark.cn 的链接
+_QUARK_LINK_RE = re.compile(r'https?://pan\.quark\.cn/[^ ]+')
+
+# 瓦力搜索标题中的关键词高亮标签
+_EM_TAG_RE = re.compile(r'</?em>')
+
+# 请求重试：429/5xx 或连接错误时指数退避（带抖动）重试
+RETRY_STATUSES = frozenset((429, 502, 503, 504))
+RETRY_BACKOFF = 0.2
+MAX_RETRY_DELAY = 2
+# 熔断：同一主机连续失败达到阈值后，在冷却时间内直接放弃请求
+BREAKER_THRESHOLD = 5
+BREAKER_COOLDOWN = 30
+_host_failures = {}  # host -> (连续失败次数, 熔断截止时间)
+
+# kkkob 的搜索接口
+KKKOB_ENDPOINTS = ('getJuzi', 'search', 'getDJ', 'getXiaoyu', 'getSearchX')
+# kkkob token 复用时长（秒），接口拒绝 token 时立即重新获取
+KKKOB_TOKEN_TTL = 240
+KKKOB_AUTH_STATUSES = frozenset((401, 403))
+
+# 单次搜索中最多并发验证的候选资源数
+MAX_VALIDATE_CANDIDATES = 15
+
+# 资源有效性验证结果缓存：有效结果保留5分钟，失效结果30秒后重新验证
+_stoken_cache = TTLCache(maxsize=4096, ttl=300)
+STOKEN_NEGATIVE_TTL = 30
+STOKEN_CONCURRENCY = 8
+
+@dataclass(slots=True)
+class SearchHit:
+    """单条搜索结果"""
+    title: str
+    url: str
+    sno: int = 0  # 在最终回复中的序号
+
+
+if msgspec is not None:
+    class WalisoItem(msgspec.Struct):
+        disk_name: str = "未知标题"
+        link: str = ""
+
+    class WalisoData(msgspec.Struct):
+        items: list[WalisoItem] = msgspec.field(default_factory=list, name="list")
+
+    class WalisoResp(msgspec.Struct):
+        code: int = 0
+        data: WalisoData | None = None
+        msg: str = ""
+
+    class CloudpanRecord(msgspec.Struct):
+        title: str = ""
+        shareUrl: str = ""
+
+    class CloudpanData(msgspec.Struct):
+        records: list[CloudpanRecord] = []
+
+    class CloudpanResp(msgspec.Struct):
+        code: int = 0
+        data: CloudpanData | None = None
+
+    _waliso_decoder = msgspec.json.Decoder(WalisoResp)
+    _cloudpan_decoder = msgspec.json.Decoder(CloudpanResp)
+
+
+def _decode_waliso(body: bytes):
+    """解析瓦力搜索响应，返回 (code, msg, [(disk_name, link), ...])"""
+    if msgspec is not None:
+        try:
+            resp = _waliso_decoder.decode(body)
+            items = resp.data.items if resp.data else ()
+            return resp.code, resp.msg, [(item.disk_name, item.link) for item in items]
+        except msgspec.DecodeError:
+            pass  # 字段类型与预期不符时退回通用解析
+    data = json_loads(body)
+    items = (data.get("data") or {}).get("list") or ()
+    return data.get("code"), data.get("msg"), [
+        (item.get("disk_name", "未知标题"), item.get("link", "")) for item in items
+    ]
+
+
+def _decode_cloudpan(body: bytes):
+    """解析 cloudpan 搜索响应，返回 (code, [(title, shareUrl), ...])"""
+    if msgspec is not None:
+        try:
+            resp = _cloudpan_decoder.decode(body)
+            records = resp.data.records if resp.data else ()
+            return resp.code, [(record.title, record.shareUrl) for record in records]
+        except msgspec.DecodeError:
+            pass
+    response = json_loads(body)
+    records = response['data']['records'] if response['data'] else ()
+    return response['code'], [(item['title'], item['shareUrl']) for item in records]
+
+
+# 各搜索源结果缓存，键为 (搜索源, 规范化后的关键词, 其他参数)；空结果只保留10秒以便尽快重试
+_provider_cache = TTLCache(maxsize=1024, ttl=60)
+EMPTY_RESULT_TTL = 10
+
+
+def _cached_provider(func):
+    """缓存搜索源的最终结果，重复查询直接返回，不再访问网络
+
+    缓存的是搜索源未去重的完整结果；seen 为多个搜索源共享的 pwd_id 集合，
+    取出结果后再跳过其他搜索源已返回的资源，只有实际返回的资源才记入 seen
+    """
+    @wraps(func)
+    async def wrapper(self, qry_key, *args, seen=None):
+        key = (func.__name__, qry_key.strip().lower(), *args)
+        hits = _provider_cache.get(key)
+        if hits is None:
+            hits = await func(self, qry_key, *args)
+            _provider_cache.set(key, hits, None if hits else EMPTY_RESULT_TTL)
+        if seen is not None:
+            unique = []
+            for hit in hits:
+                pwd_id = self.get_id_from_url(hit.url)[0]
+                if pwd_id not in seen:
+                    seen.add(pwd_id)
+                    unique.append(hit)
+            hits = unique
+        # 调用方会修改 sno，返回副本以免污染缓存
+        return [SearchHit(hit.title, hit.url) for hit in hits]
+    return wrapper
+
 
 class QURAK:
+    def __init__(self):
+        # 所有搜索源共用一个连接池，在首次请求时于运行中的事件循环上创建
+        self._session = None
+        # 限制同时发往 drive-m.quark.cn 的验证请求数，使其复用少量长连接
+        self._stoken_semaphore = asyncio.Semaphore(STOKEN_CONCURRENCY)
+        # 进行中的验证请求，同一 pwd_id 只发一次请求
+        self._stoken_inflight = {}
+        # 缓存的 kkkob token 及获取时间，锁保证并发查询只刷新一次
+        self._kkkob_token = ('', 0.0)
+        self._kkkob_token_lock = asyncio.Lock()
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=32,  # 总连接数上限
+                limit_per_host=16,  # 单个搜索源的连接上限，验证资源时并发请求同一主机
+                ttl_dns_cache=300,
+                keepalive_timeout=30
+            )
+            self._session = aiohttp.ClientSession(connector=connector, json_serialize=json_dumps)
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def _request(self, method: str, url: str, retries: int = 2, **kwargs):
+        """发送请求并返回 (状态码, 响应体)，对 429/5xx 与连接错误做有限次退避重试"""
+        host = urlsplit(url).hostname
+        failures, open_until = _host_failures.get(host, (0, 0.0))
+        if failures >= BREAKER_THRESHOLD and time.monotonic() < open_until:
+            raise aiohttp.ClientError(f"{host} 连续请求失败，暂停访问")
+
+        session = await self._get_session()
+        for attempt in range(retries + 1):
+            delay = min(MAX_RETRY_DELAY, RETRY_BACKOFF * 2 ** attempt * random.uniform(0.5, 1.5))
+            try:
+                async with session.request(method, url, **kwargs) as response:
+                    status_code = response.status
+                    retry_after = response.headers.get("Retry-After")
+                    body = await response.read()
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                if attempt >= retries:
+                    self._record_failure(host)
+                    raise
+            else:
+                if status_code not in RETRY_STATUSES or attempt >= retries:
+                    if status_code >= 500 or status_code == 429:
+                        self._record_failure(host)
+                    else:
+                        _host_failures.pop(host, None)
+                    return status_code, body
+                if retry_after and retry_after.isdigit():
+                    delay = min(MAX_RETRY_DELAY, int(retry_after))
+            await asyncio.sleep(delay)
+
+    @staticmethod
+    def _record_failure(host):
+        failures = _host_failures.get(host, (0, 0.0))[0] + 1
+        _host_failures[host] = (failures, time.monotonic() + BREAKER_COOLDOWN)
+
     def get_id_from_url(self, url):
         try:
-            url = url.replace("https://pan.quark.cn/s/", "")
-            pattern = r"(\w+)(#/list/share.*/(\w+))?"
-            match = re.search(pattern, url)
+            # 常见格式 https://pan.quark.cn/s/<pwd_id>[#/list/share.../<pdir_fid>] 直接切分字符串
+            if url.startswith(QUARK_SHARE_PREFIX):
+                head, sep, tail = url[len(QUARK_SHARE_PREFIX):].partition("#/list/share")
+                if not head:
+                    return None, None
+                if _is_word(head):
+                    if not sep:
+                        return head, 0
+                    pdir_fid = tail.rsplit("/", 1)[-1]
+                    if "/" in tail and _is_word(pdir_fid):
+                        return head, pdir_fid
+
+            # 其他格式交给正则处理
+            match = _URL_ID_RE.search(url)
             if match:
                 pwd_id = match.group(1)
                 if match.group(2):
@@ -69,34 +316,78 @@ class QURAK:
             return None, None
 
     # 可验证资源是否失效
-    def get_stoken(self, pwd_id):
+    async def get_stoken(self, pwd_id):
         if not pwd_id:
             return False, "Invalid URL"
             
+        cached = _stoken_cache.get(pwd_id)
+        if cached is not None:
+            return cached
+
+        task = self._stoken_inflight.get(pwd_id)
+        if task is None:
+            task = asyncio.create_task(self._fetch_stoken(pwd_id))
+            self._stoken_inflight[pwd_id] = task
+            task.add_done_callback(lambda _: self._stoken_inflight.pop(pwd_id, None))
+        return await asyncio.shield(task)
+
+    async def _fetch_stoken(self, pwd_id):
         try:
             url = "https://drive-m.quark.cn/1/clouddrive/share/sharepage/token"
             querystring = {"pr": "ucpro", "fr": "h5"}
             payload = {"pwd_id": pwd_id, "passcode": ""}
-            response = requests.request(
-                "POST", url, json=payload, headers=quark_headers, params=querystring, timeout=3
-            ).json()
+            # 验证请求数量多，只重试一次以免放大并发
+            async with self._stoken_semaphore:
+                _, body = await self._request(
+                    "POST", url, retries=1,
+                    json=payload, headers=quark_headers, params=querystring, timeout=aiohttp.ClientTimeout(total=3)
+                )
+            response = json_loads(body)
             if response.get("data"):
-                return True, response["data"]["stoken"]
+                result = True, response["data"]["stoken"]
+                _stoken_cache.set(pwd_id, result)
             else:
-                return False, response["message"]
+                result = False, response["message"]
+                _stoken_cache.set(pwd_id, result, ttl=STOKEN_NEGATIVE_TTL)
+            return result
         except Exception as e:
             logger.error(f"[QURAK] 验证资源异常: {e}")
             return False, str(e)
 
+    async def _filter_sharing(self, candidates, limit=5):
+        """并发验证候选资源 [(title, url), ...]，凑满 limit 个仍在分享的资源后取消其余验证
+
+        多个搜索源返回同一资源时，验证请求由 get_stoken 的缓存和进行中任务合并为一次
+        """
+        candidates = candidates[:MAX_VALIDATE_CANDIDATES]
+        pending = {
+            asyncio.create_task(self.get_stoken(self.get_id_from_url(url)[0])): index
+            for index, (_, url) in enumerate(candidates)
+        }
+        valid = []
+        try:
+            while pending and len(valid) < limit:
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    index = pending.pop(task)
+                    if task.result()[0]:
+                        valid.append(index)
+        finally:
+            for task in pending:
+                task.cancel()
+        # 按搜索源原本的排序返回
+        return [SearchHit(*candidates[index]) for index in sorted(valid)[:limit]]
+
     # 新增瓦力搜索方法
-    def get_waliso_search(self, qry_key: str, resource_type="QUARK"):
+    @_cached_provider
+    async def get_waliso_search(self, qry_key: str, resource_type="QUARK"):
         """
         使用瓦力搜索API进行资源搜索
         支持夸克网盘(QUARK)和百度云(BDY)
         """
         # 使用v1接口
         url = "https://waliso.com/v1/search/disk"
-        headers = waliso_headers.copy()
+        headers = waliso_headers
         
         # 搜索参数 - 更新为正确的格式
         params = {
@@ -114,69 +405,54 @@ class QURAK:
         
         result_json = []
         try:
-            logger.info(f"[QURAK] 开始瓦力搜索: {qry_key}, 资源类型: {resource_type}")
-            
-            # 禁用SSL警告
-            import urllib3
-            urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+            logger.debug("[QURAK] 开始瓦力搜索: {}, 资源类型: {}", qry_key, resource_type)
             
             # 使用不验证SSL证书的方式访问API
-            response = requests.post(
+            status_code, body = await self._request(
+                "POST",
                 url, 
+                # 瓦力搜索直接面向用户且超时较长，不重试，失败后尽快转到其他搜索源
+                retries=0,
                 json=params, 
                 headers=headers, 
-                timeout=15,
-                verify=False,  # 不验证SSL证书
+                timeout=aiohttp.ClientTimeout(total=15),
+                ssl=False,  # 不验证SSL证书
                 allow_redirects=True  # 允许重定向
             )
             
-            if response.status_code == 200:
+            if status_code == 200:
                 try:
-                    data = response.json()
+                    code, api_msg, items = _decode_waliso(body)
                     
-                    if data.get("code") == 200 and data.get("data") and data["data"].get("list"):
-                        items = data["data"]["list"]
-                        logger.info(f"[QURAK] 瓦力搜索找到 {len(items)} 个结果")
+                    if code == 200 and items:
+                        logger.debug("[QURAK] 瓦力搜索找到 {} 个结果", len(items))
                         
-                        i = 1
-                        for item in items:
-                            if i > 5:  # 最多返回5个结果
-                                break
-                                
-                            title = item.get("disk_name", "未知标题").replace("<em>", "").replace("</em>", "")
-                            url = item.get("link", "")
+                        candidates = []
+                        for title, url in items:
+                            title = _EM_TAG_RE.sub("", title)
                             
                             if not url:
                                 continue
                                 
-                            # 验证资源有效性
                             if resource_type == "QUARK" and "quark" in url:
-                                pwd_id, _ = self.get_id_from_url(url)
-                                is_sharing, _ = self.get_stoken(pwd_id)
-                                
-                                if is_sharing:
-                                    item_dict = {
-                                        'title': title,
-                                        'url': url
-                                    }
-                                    result_json.append(item_dict)
-                                    i += 1
+                                candidates.append((title, url))
                             # 百度云资源不做验证，直接返回
                             elif resource_type == "BDY" and ("baidu" in url or "pan.baidu" in url):
-                                item_dict = {
-                                    'title': title,
-                                    'url': url
-                                }
-                                result_json.append(item_dict)
-                                i += 1
+                                result_json.append(SearchHit(title=title, url=url))
+                                if len(result_json) >= 5:  # 最多返回5个结果
+                                    break
+                        
+                        # 并发验证夸克资源有效性
+                        if candidates:
+                            result_json = await self._filter_sharing(candidates)
                         
-                        logger.info(f"[QURAK] 瓦力搜索验证后有效结果: {len(result_json)} 个")
+                        logger.debug("[QURAK] 瓦力搜索验证后有效结果: {} 个", len(result_json))
                     else:
-                        logger.warning(f"[QURAK] 瓦力搜索结果为空或API返回错误: {data.get('msg')}")
+                        logger.warning(f"[QURAK] 瓦力搜索结果为空或API返回错误: {api_msg}")
                 except ValueError as json_err:
                     logger.error(f"[QURAK] 瓦力搜索JSON解析错误: {json_err}")
             else:
-                logger.error(f"[QURAK] 瓦力搜索请求失败，状态码: {response.status_code}")
+                logger.error(f"[QURAK] 瓦力搜索请求失败，状态码: {status_code}")
                 
         except Exception as e:
             logger.error(f"[QURAK] 瓦力搜索异常: {e}")
@@ -184,21 +460,22 @@ class QURAK:
         return result_json
         
     # 更新为使用新API的方法
-    def get_qry_external_4(self, qry_key: str, resource_type="QUARK"):
+    async def get_qry_external_4(self, qry_key: str, resource_type="QUARK"):
         """
         使用waliso.com的新API搜索资源，支持夸克网盘和百度云
         """
-        return self.get_waliso_search(qry_key, resource_type)
+        return await self.get_waliso_search(qry_key, resource_type)
 
     # 百度云搜索功能
-    def get_baidu_search(self, qry_key: str):
+    async def get_baidu_search(self, qry_key: str):
         """
         使用瓦力搜索API搜索百度云资源
         """
-        return self.get_waliso_search(qry_key, "BDY")
+        return await self.get_waliso_search(qry_key, "BDY")
 
     # 查询资源1
-    def get_qry_external(self, qry_key: str):
+    @_cached_provider
+    async def get_qry_external(self, qry_key: str):
         url = f"http://www.662688.xyz/api/get_zy"
         params = {
             "keyword": qry_key,
@@ -206,33 +483,21 @@ class QURAK:
         items_json = []
         msg = '外部资源1查询结果：\n'
         try:
-            response = requests.get(url, params=params, timeout=1)
+            status_code, body = await self._request("GET", url, params=params, timeout=aiohttp.ClientTimeout(total=1))
+            data = json_loads(body) if status_code == 200 else None
             # 检查请求是否成功
-            if response.status_code == 200:
-                # 解析返回的JSON数据
-                data = response.json()
+            if status_code == 200:
                 # 打印返回的数据，或者进行其他处理
 
-                i = 1
                 if data.get("data"):
                     first_three_items = data['data']
-                    # 打印结果
+                    # 先收集候选资源，再并发判断夸克资源是否失效
+                    candidates = []
                     for item in first_three_items:
-                        item_str = str(item)  # 将item转换为字符串
-                        if 'quark' in item_str and i <=5:
-                            # 判断夸克资源是否失效
-                            pwd_id, pdir_fid = self.get_id_from_url(item['url'])
-                            is_sharing, stoken = self.get_stoken(pwd_id)
-                            if is_sharing:
-                                # msg += str(i) + '.' + f"{item['title']}\n{item['url']}\n"
-                                # 创建一个字典，包含标题和URL
-                                item_dict = {
-                                    'title': item['title'],
-                                    'url': item['url']
-                                }
-                                # 将字典添加到列表中
-                                items_json.append(item_dict)
-                                i += 1
+                        url = item.get('url', '')
+                        if 'quark' in url:
+                            candidates.append((item['title'], url))
+                    items_json = await self._filter_sharing(candidates)
                 else:
                     msg += '未查询到数据1'
             else:
@@ -243,7 +508,8 @@ class QURAK:
         return items_json
 
     # 查询资源2
-    def get_qry_external_2(self, qry_key: str):
+    @_cached_provider
+    async def get_qry_external_2(self, qry_key: str):
         url = f"https://www.hhlqilongzhu.cn/api/ziyuan_nanfeng.php"
         params = {
             "keysearch": qry_key,
@@ -252,52 +518,38 @@ class QURAK:
         msg = '外部资源2查询结果：\n'
 
         try:
-            response = requests.get(url, params=params, timeout=1)
+            status_code, body = await self._request("GET", url, params=params, timeout=aiohttp.ClientTimeout(total=1))
+            data = json_loads(body) if status_code == 200 else None
             # 检查请求是否成功
-            if response.status_code == 200:
-                # 解析返回的JSON数据
-                data = response.json()
+            if status_code == 200:
 
-                i = 1
                 if data.get("data"):
                     first_three_items = data['data']
-                    # 打印结果
+                    # 先收集候选资源，再并发判断夸克资源是否失效
+                    candidates = []
                     for item in first_three_items:
-                        item_str = str(item)  # 将item转换为字符串
-                        if 'quark' in item_str and i <=5:
-                            url = item['data_url'].split("链接：")[1]
-                            title = item['title']
-                            # 判断夸克资源是否失效
-                            pwd_id, pdir_fid = self.get_id_from_url(url)
-                            is_sharing, stoken = self.get_stoken(pwd_id)
-                            if is_sharing:
-                                # msg += str(i) + '.' + f"{item['title']}\r\n{url}\n"
-                                # 创建一个字典，包含标题和URL
-                                item_dict = {
-                                    'title': title,
-                                    'url': url
-                                }
-                                # 将字典添加到列表中
-                                items_json.append(item_dict)
-                                i += 1
+                        data_url = item.get('data_url', '')
+                        if 'quark' in data_url:
+                            url = data_url.split("链接：")[1]
+                            candidates.append((item['title'], url))
+                    items_json = await self._filter_sharing(candidates)
                 else:
                     msg += '未查询到数据2'
-                    print(msg)
+                    logger.debug("[QURAK] {}", msg)
             else:
                 msg += '查询请求失败2'
-                print(msg)
+                logger.debug("[QURAK] {}", msg)
         except Exception:
             msg += f"查询请求失败2"
-            print(msg)
+            logger.debug("[QURAK] {}", msg)
 
         return items_json
 
     # 查询资源3
-    def get_qry_external_3(self, qry_key: str):
+    @_cached_provider
+    async def get_qry_external_3(self, qry_key: str):
         url = f"https://v.funletu.com/search"
-        headers = quark_headers.copy()
-        headers['origin'] = 'https://pan.funletu.com'
-        headers['referer'] = 'https://pan.funletu.com/'
+        headers = funletu_headers
         params = {
                     "style": "get",
                     "datasrc": "search",
@@ -325,81 +577,55 @@ class QURAK:
         msg = '外部资源3查询结果：\n'
         result_json = []
         try:
-            response = requests.post(url, json=params, headers=headers, timeout=1).json()
-            print(response)
+            _, body = await self._request("POST", url, json=params, headers=headers, timeout=aiohttp.ClientTimeout(total=1))
+            response = json_loads(body)
 
             # 检查请求是否成功
             if response['status'] == 200:  # 假设0表示成功
-                i = 1
                 if response['data']:
                     first_three_items = response['data']
-                    # 打印结果
+                    # 先收集候选资源，再并发判断夸克资源是否失效
+                    candidates = []
                     for item in first_three_items:
-                        item_str = str(item)  # 将item转换为字符串
-                        if 'quark' in item_str and i <= 5:
-                            url = item['url'].replace("?entry=funletu", "", 1)
-                            title = item['title']
-                            # 判断夸克资源是否失效
-                            pwd_id, pdir_fid = self.get_id_from_url(url)
-                            is_sharing, stoken = self.get_stoken(pwd_id)
-                            if is_sharing:
-                                # msg += str(i) + '.' + f"{item['title']}\r\n{url}\n"
-                                item_dict = {
-                                    'url': url,
-                                    'title': title
-                                }
-                                # 将字典添加到列表中
-                                result_json.append(item_dict)
-                                i += 1
+                        url = item.get('url', '')
+                        if 'quark' in url:
+                            url = url.replace("?entry=funletu", "", 1)
+                            candidates.append((item['title'], url))
+                    result_json = await self._filter_sharing(candidates)
                 else:
                     msg += '未查询到数据3'
-                    print(msg)
+                    logger.debug("[QURAK] {}", msg)
             else:
                 msg += '查询请求失败3'
-                print(msg)
+                logger.debug("[QURAK] {}", msg)
         except Exception:
             msg += f"查询请求失败3"
-            print(msg)
+            logger.debug("[QURAK] {}", msg)
 
         return result_json
         
-    def get_qry_external_5(self, qry_key: str):
+    @_cached_provider
+    async def get_qry_external_5(self, qry_key: str):
         url = f"https://api.cloudpan.cn/index/search"
-        headers = quark_headers.copy()
-        headers['origin'] = 'https://cloudpan.cn'
-        headers['referer'] = 'https://cloudpan.cn/'
+        headers = cloudpan_headers
         params = {"page": 1, "pageSize": 20, "searchText": qry_key, "fileType": 0}
 
         result_json = []
         msg = '外部资源5查询结果：\n'
 
         try:
-            response = requests.post(url, json=params, headers=headers, timeout=1).json()
-            print(response)
+            _, body = await self._request("POST", url, retries=1, json=params, headers=headers, timeout=aiohttp.ClientTimeout(total=1))
+            code, records = _decode_cloudpan(body)
 
             # 检查请求是否成功
-            if response['code'] == 200:  # 假设0表示成功
-                i = 1
-                if response['data']:
-                    first_three_items = response['data']['records']
-                    # 打印结果
-                    for item in first_three_items:
-                        item_str = str(item)  # 将item转换为字符串
-                        if i <= 5:
-                            title = item['title']
-                            url = 'https://pan.quark.cn/s/' + item['shareUrl']
-                            # 判断夸克资源是否失效
-                            pwd_id, pdir_fid = self.get_id_from_url(url)
-                            is_sharing, stoken = self.get_stoken(pwd_id)
-                            if is_sharing:
-                                # msg += str(i) + '.' + f"{title}\r\n{url}\n"
-                                item_dict = {
-                                    'url': url,
-                                    'title': title.encode('utf-8').decode('utf-8')
-                                }
-                                # 将字典添加到列表中
-                                result_json.append(item_dict)
-                                i += 1
+            if code == 200:  # 假设0表示成功
+                if records:
+                    # 先收集候选资源，再并发判断夸克资源是否失效
+                    candidates = [
+                        (title, QUARK_SHARE_PREFIX + share_url)
+                        for title, share_url in records
+                    ]
+                    result_json = await self._filter_sharing(candidates)
                 else:
                     msg += '未查询到数据'
             else:
@@ -409,77 +635,82 @@ class QURAK:
 
         return result_json
 
-    def get_kkkob_token(self):
+    async def get_kkkob_token(self, refresh=False):
+        """获取 kkkob token，KKKOB_TOKEN_TTL 内复用缓存；refresh 为 True 时强制重新获取"""
+        stale = self._kkkob_token[0]
+        if not refresh and stale and time.monotonic() - self._kkkob_token[1] < KKKOB_TOKEN_TTL:
+            return stale
+        async with self._kkkob_token_lock:
+            token, fetched_at = self._kkkob_token
+            # 等锁期间其他查询已刷新过，直接使用新 token
+            if token and token != stale and time.monotonic() - fetched_at < KKKOB_TOKEN_TTL:
+                return token
+            token = await self._fetch_kkkob_token()
+            self._kkkob_token = (token, time.monotonic()) if token else ('', 0.0)
+            return token
+
+    async def _fetch_kkkob_token(self):
         try:
             url = 'http://z.kkkob.com/v/api/getToken'
-            # 使用 requests 获取网页内容
-            response = requests.get(url)
-            if response.status_code == 200:
-                return response.json().get('token')
+            status_code, body = await self._request("GET", url)
+            if status_code == 200:
+                return json_loads(body).get('token')
         except Exception as e:
-            print(e)
+            logger.error("[QURAK] 获取kkkob token异常: {}", e)
         return ''
 
-    def get_kkkob_result(self, qry: str, url: str, token: str):
+    async def get_kkkob_result(self, qry: str, url: str, token: str):
+        """查询单个 kkkob 接口；token 被拒绝时返回 None"""
         result_json = []
         msg = '查询结果kk：\n'
         try:
-            headers = kkkob_headers.copy()
+            headers = kkkob_headers
             params = {"name": qry, "token": token}
-            response = requests.post(url, data=params, headers=headers, timeout=1)
-            # print(response)
+            status_code, body = await self._request("POST", url, data=params, headers=headers, timeout=aiohttp.ClientTimeout(total=1))
+            if status_code in KKKOB_AUTH_STATUSES:
+                return None
+            response = json_loads(body) if status_code == 200 else None
             # 检查请求是否成功
-            if response.status_code == 200:
-                response = response.json()
-                i = 1
+            if status_code == 200:
                 if response['list']:
                     first_three_items = response['list']
-                    # 打印结果
+                    # 先收集候选资源，再并发判断夸克资源是否失效
+                    candidates = []
                     for item in first_three_items:
-                        item_str = str(item)  # 将item转换为字符串
-                        if 'quark' in item_str and i <= 3:
-                            title = item['question']
-
-                            # 正则表达式，用于匹配以https://开头，包含pan.quark.cn的链接
-                            pattern = r'https?://pan\.quark\.cn/[^ ]+'
-
-                            # 使用re.search查找匹配的链接
-                            match = re.search(pattern, item['answer'])
-                            url = match.group(0)
-                            # url = item['answer'].replace(title + "链接：", "", 1)
-                            # 判断夸克资源是否失效
-                            pwd_id, pdir_fid = self.get_id_from_url(url)
-                            is_sharing, stoken = self.get_stoken(pwd_id)
-                            if is_sharing:
-                                # msg += str(i) + '.' + f"{item['title']}\r\n{url}\n"
-                                item_dict = {
-                                    'url': url,
-                                    'title': title
-                                }
-                                # 将字典添加到列表中
-                                result_json.append(item_dict)
-                                i += 1
+                        # 查找回答中的夸克链接，没有链接的条目直接跳过
+                        match = _QUARK_LINK_RE.search(item.get('answer', ''))
+                        if match:
+                            candidates.append((item['question'], match.group(0)))
+                    result_json = await self._filter_sharing(candidates, limit=3)
                 else:
                     msg += '未查询到数据kk'
             else:
                 msg += '查询请求失败kk'
         except Exception as e:
-            print(e)
+            logger.error("[QURAK] kkkob搜索异常: {}", e)
         return result_json
 
-    def qry_kkkob(self, qry: str):
-
-        result_json = []
+    @_cached_provider
+    async def qry_kkkob(self, qry: str):
 
         # 获取token
-        token = self.get_kkkob_token()
-        if token == '':
-            return result_json
+        token = await self.get_kkkob_token()
+        if not token:
+            return []
 
-        result_json += self.get_kkkob_result(qry, 'http://z.kkkob.com/v/api/getJuzi', token)
-        result_json += self.get_kkkob_result(qry, 'http://z.kkkob.com/v/api/search', token)
-        result_json += self.get_kkkob_result(qry, 'http://z.kkkob.com/v/api/getDJ', token)
-        result_json += self.get_kkkob_result(qry, 'http://z.kkkob.com/v/api/getXiaoyu', token)
-        result_json += self.get_kkkob_result(qry, 'http://z.kkkob.com/v/api/getSearchX', token)
+        # 五个接口互不依赖，并发请求
+        urls = [f'http://z.kkkob.com/v/api/{endpoint}' for endpoint in KKKOB_ENDPOINTS]
+        parts = await asyncio.gather(*[
+            self.get_kkkob_result(qry, url, token) for url in urls
+        ])
 
-        return result_json
\ No newline at end of file
+        # token 失效：刷新一次后重试被拒绝的接口
+        rejected = [url for url, part in zip(urls, parts) if part is None]
+        if rejected:
+            token = await self.get_kkkob_token(refresh=True)
+            retried = await asyncio.gather(*[
+                self.get_kkkob_result(qry, url, token) for url in rejected
+            ]) if token else []
+            parts = [part for part in parts if part is not None]
+            parts.extend(part for part in retried if part is not None)
+        return list(chain.from_iterable(parts))
@@ -1,11 +1,18 @@
 import asyncio
 import json
+import pickle
 import re
+import sys
+import threading
+import time
 import tomllib
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
 from typing import Dict, Optional
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 import os
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 from PIL import Image, ImageDraw, ImageFont
 import io
 
@@ -16,6 +23,148 @@ from WechatAPI import WechatAPIClient
 from utils.decorators import on_text_message, on_at_message, schedule
 from utils.plugin_base import PluginBase
 
+# 分析命令与@标记的正则，每条消息都会用到，在模块加载时编译
+_CMD_RE = re.compile(r'^(分析股票|股票分析|分析|analyze)\s*([0-9A-Za-z]{4,8})$')
+_AT_STRIP_RE = re.compile(r'@\S+\s+')
+
+# 名称映射的数据来源：市场类型 -> (AkShare 函数名, 代码列, 名称列)
+_NAME_SOURCES = {
+    'FUND': ('fund_em_fund_name', '基金代码', '基金简称'),
+    'ETF': ('fund_etf_spot_em', '代码', '名称'),
+    'LOF': ('fund_lof_spot_em', '代码', '名称'),
+    'HK': ('stock_hk_spot_em', '代码', '名称'),
+    'US': ('stock_us_spot_em', '代码', '名称'),
+}
+
+# 报告中使用的货币符号
+_CURRENCY_SYMBOL = {'CNY': '¥', 'HKD': 'HK$', 'USD': '$'}
+
+# 综合评分下限 -> 投资建议，从高到低依次匹配
+_SCORE_ADVICE = (
+    (80, '强烈推荐买入'),
+    (60, '建议买入'),
+    (40, '建议观望'),
+    (20, '建议减持'),
+    (0, '建议卖出'),
+)
+
+# 代码前两位 -> 市场类型。三位前缀（002/003/001/004/005、159、501）与所属两位前缀归类相同，无需单独列出
+_CODE_PREFIX_MARKET = {
+    '60': 'A',    # 上海主板
+    '00': 'A',    # 深圳主板、中小板
+    '30': 'A',    # 创业板
+    '68': 'A',    # 科创板
+    '51': 'ETF',  # 上海ETF
+    '56': 'ETF',  # 上海ETF
+    '58': 'ETF',  # 上海ETF
+    '15': 'ETF',  # 深圳ETF
+    '16': 'LOF',  # 深圳LOF
+    '50': 'LOF',  # 上海LOF
+}
+
+# 各市场所在时区；Windows 未安装 tzdata 时退回固定时差（美股不区分夏令时）
+try:
+    _MARKET_TZ = {'CN': ZoneInfo('Asia/Shanghai'), 'US': ZoneInfo('America/New_York')}
+except ZoneInfoNotFoundError:
+    _MARKET_TZ = {'CN': timezone(timedelta(hours=8)), 'US': timezone(timedelta(hours=-5))}
+
+# 市场类型 -> (时区, 当地交易时段 HHMM 列表)，基金与ETF/LOF按A股时段
+_A_SESSIONS = ('CN', ((930, 1130), (1300, 1500)))
+_MARKET_SESSIONS = {
+    'A': _A_SESSIONS,
+    'ETF': _A_SESSIONS,
+    'LOF': _A_SESSIONS,
+    'FUND': _A_SESSIONS,
+    'HK': ('CN', ((930, 1200), (1300, 1600))),
+    'US': ('US', ((930, 1600),)),
+}
+
+# 安装了 numba 时将指标计算编译为本地代码，未安装时使用 NumPy 向量化实现
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+
+def _normalize_code(code) -> str:
+    """统一代码格式并驻留字符串，各缓存中的相同代码共用同一对象，字典查找可直接按对象比较"""
+    return sys.intern(str(code).strip().upper())
+
+
+def _rolling_mean(values: np.ndarray, window: int) -> np.ndarray:
+    """基于累加和的滑动平均，前 window-1 个位置为 NaN，与 pandas rolling(window).mean() 一致"""
+    out = np.full(values.shape, np.nan)
+    if len(values) >= window:
+        csum = np.cumsum(np.concatenate(([0.0], values)))
+        out[window - 1:] = (csum[window:] - csum[:-window]) / window
+    return out
+
+
+def _indicator_loops(close):
+    """逐日计算 RSI/MACD/信号线/MA5/MA10/MA20/波动率，结果与 NumPy/pandas 实现一致"""
+    n = close.shape[0]
+    rsi = np.full(n, np.nan)
+    macd = np.empty(n)
+    signal = np.empty(n)
+    ma5 = np.full(n, np.nan)
+    ma10 = np.full(n, np.nan)
+    ma20 = np.full(n, np.nan)
+    volatility = np.full(n, np.nan)
+    
+    # 前缀和：用相减求窗口和，窗口内全为0时结果精确为0
+    close_sum = np.zeros(n + 1)
+    gain_sum = np.zeros(n + 1)
+    loss_sum = np.zeros(n + 1)
+    a12 = 2.0 / 13.0
+    a26 = 2.0 / 27.0
+    a9 = 2.0 / 10.0
+    ema12 = close[0]
+    ema26 = close[0]
+    for i in range(n):
+        x = close[i]
+        delta = x - close[i - 1] if i > 0 else 0.0
+        close_sum[i + 1] = close_sum[i] + x
+        gain_sum[i + 1] = gain_sum[i] + max(delta, 0.0)
+        loss_sum[i + 1] = loss_sum[i] + max(-delta, 0.0)
+        
+        # MACD：EMA12 - EMA26，信号线为 MACD 的 EMA9
+        if i > 0:
+            ema12 = a12 * x + (1.0 - a12) * ema12
+            ema26 = a26 * x + (1.0 - a26) * ema26
+        macd[i] = ema12 - ema26
+        signal[i] = macd[i] if i == 0 else a9 * macd[i] + (1.0 - a9) * signal[i - 1]
+        
+        if i >= 13:
+            gain = (gain_sum[i + 1] - gain_sum[i - 13]) / 14
+            loss = (loss_sum[i + 1] - loss_sum[i - 13]) / 14
+            if loss != 0.0:
+                rsi[i] = 100.0 - 100.0 / (1.0 + gain / loss)
+            elif gain > 0.0:
+                rsi[i] = 100.0
+        if i >= 4:
+            ma5[i] = (close_sum[i + 1] - close_sum[i - 4]) / 5
+        if i >= 9:
+            ma10[i] = (close_sum[i + 1] - close_sum[i - 9]) / 10
+        if i >= 19:
+            ma20[i] = (close_sum[i + 1] - close_sum[i - 19]) / 20
+        if i >= 20:
+            # 20日收益率的样本标准差，年化后以百分比表示
+            mean = 0.0
+            for k in range(i - 19, i + 1):
+                mean += close[k] / close[k - 1] - 1.0
+            mean /= 20
+            var = 0.0
+            for k in range(i - 19, i + 1):
+                diff = close[k] / close[k - 1] - 1.0 - mean
+                var += diff * diff
+            volatility[i] = np.sqrt(var / 19) * np.sqrt(252.0) * 100
+    return rsi, macd, signal, ma5, ma10, ma20, volatility
+
+
+# 不开启 nnan/ninf，以保留 RSI 与波动率中的 NaN 语义
+_indicator_kernel = njit(cache=True, fastmath={'reassoc', 'contract'})(_indicator_loops) if njit else None
+
+
 class StockAnalysis(PluginBase):
     """
     一个用于分析股票数据的插件，通过调用股票分析API获取股票信息，
@@ -27,7 +176,39 @@ class StockAnalysis(PluginBase):
     version = "1.0.0"
 
     # 分析命令的正则表达式
-    STOCK_COMMAND_PATTERN = r'^(分析股票|股票分析|分析|analyze)\s*([0-9A-Za-z]{4,8})$'
+    STOCK_COMMAND_PATTERN = _CMD_RE.pattern
+    
+    # 配置文件在类上只解析一次；插件重载时模块重新执行，会重新读取
+    _CFG_PATH = os.path.join(os.path.dirname(__file__), "config.toml")
+    _cfg = None
+    
+    # A股实时行情快照缓存时长（秒）：交易时段30秒，其余时间1小时
+    SPOT_CACHE_TTL_TRADING = 30
+    SPOT_CACHE_TTL_IDLE = 3600
+    
+    # A股代码集合只用于市场类型判断，上市/退市变化很慢，缓存10分钟
+    A_CODES_TTL = 600
+    
+    # 基金、港股、美股的代码 -> 名称映射缓存时长（秒），每个来源每小时最多下载一次全表
+    NAME_CACHE_TTL = 3600
+    
+    # AkShare 调用的并发上限、相邻两次调用的最小间隔（秒）和限流类错误的重试次数
+    AK_CONCURRENCY = 4
+    AK_MIN_INTERVAL = 0.2
+    AK_MAX_RETRIES = 3
+    # 错误信息中出现这些片段时视为上游限流或网络抖动，退避后重试
+    AK_RETRY_MARKERS = ('429', 'Max retries', 'timeout', 'Timeout', 'Connection aborted', 'RemoteDisconnected')
+    
+    # 计算好指标的行情数据缓存时长（秒）：交易时段60秒，其余时间按当日缓存
+    DATA_CACHE_TTL_TRADING = 60
+    DATA_CACHE_TTL_IDLE = 24 * 3600
+    
+    # 发送给 Dify 的历史行情列
+    HISTORY_COLUMNS = ['date', 'open', 'close', 'high', 'low', 'volume', 'change_pct']
+    
+    # 等待 Dify 分析结果的最长时间，以及插件关闭时等待分析任务结束的宽限时间（秒）
+    DIFY_TIMEOUT = 120
+    SHUTDOWN_GRACE_PERIOD = 5
     
     # 响应等待消息
     ANALYSIS_IN_PROGRESS_PROMPT = """
@@ -53,9 +234,7 @@ class StockAnalysis(PluginBase):
             raise
             
         # 加载配置
-        config_path = os.path.join(os.path.dirname(__file__), "config.toml")
-        with open(config_path, "rb") as f:
-            config = tomllib.load(f)
+        config = self._load_config()
             
         self.config = config.get("StockAnalysis", {})
         
@@ -82,7 +261,30 @@ class StockAnalysis(PluginBase):
             logger.warning("股票分析插件未启用，请检查config.toml文件")
         
         self.analysis_tasks = {}  # 存储正在进行的分析任务
-        self.http_session = aiohttp.ClientSession()
+        
+        # 所有 AkShare 调用共用的并发限制与调用节奏，避免突发请求被上游限流
+        self._ak_sem = asyncio.Semaphore(self.AK_CONCURRENCY)
+        self._ak_next_slot = 0.0
+        
+        # A股实时行情快照：(DataFrame, 代码 -> 行号)，全表约5000行，按时长缓存
+        self._spot_cache = None
+        self._spot_cache_ts = 0.0
+        self._spot_lock = asyncio.Lock()
+        # A股代码集合，判断市场类型时做O(1)成员测试，不随行情快照频繁刷新
+        self._a_codes = frozenset()
+        self._a_codes_expires = 0.0
+        # 市场类型 -> (过期时间, {代码: 名称})
+        self._name_cache = {}
+        # 每个来源一把锁：同一来源只下载一次，不同来源的下载可以同时进行
+        self._name_locks = {source: asyncio.Lock() for source in _NAME_SOURCES}
+        
+        # (代码, 市场类型, 日期) -> (过期时间戳, 已计算指标的DataFrame)
+        self._df_cache = {}
+        # 磁盘缓存：内存缓存之下的一层，插件重启后仍可复用当日数据，保留 data_cache_days 天
+        self._cache_dir = os.path.join(os.path.dirname(__file__), "cache")
+        self._prune_disk_cache()
+        # HTTP会话在首次请求时于运行中的事件循环上创建
+        self.http_session = None
 
         # 初始化字体路径
         self.font_path = os.path.join(os.path.dirname(__file__), "fonts", "msyh.ttc")
@@ -91,82 +293,83 @@ class StockAnalysis(PluginBase):
             # 如果字体文件不存在，需要下载或复制微软雅黑字体到该位置
             self.logger.warning(f"字体文件不存在: {self.font_path}")
             self.font_path = None
+        
+        # 字体只加载一次，生成图片时直接复用
+        if self.font_path:
+            self._title_font = ImageFont.truetype(self.font_path, 40)
+            self._content_font = ImageFont.truetype(self.font_path, 30)
+            self._watermark_font = ImageFont.truetype(self.font_path, 20)
+        else:
+            # 使用默认字体
+            self._title_font = self._content_font = self._watermark_font = ImageFont.load_default()
+
+    @classmethod
+    def _load_config(cls) -> Dict:
+        """读取 config.toml，结果缓存在类上供各实例共用"""
+        if cls._cfg is None:
+            with open(cls._CFG_PATH, "rb") as f:
+                cls._cfg = tomllib.load(f)
+        return cls._cfg
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """获取访问 Dify 的会话：请求都发往同一主机，保持少量长连接复用"""
+        if self.http_session is None or self.http_session.closed:
+            connector = aiohttp.TCPConnector(limit=20, limit_per_host=8, ttl_dns_cache=300, keepalive_timeout=60)
+            self.http_session = aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=120))
+        return self.http_session
 
     async def close(self):
         """插件关闭时，取消所有未完成的分析任务并关闭会话。"""
         logger.info("正在关闭 StockAnalysis 插件")
         
-        # 取消所有未完成的分析任务
-        for chat_id, task in self.analysis_tasks.items():
-            if not task.done():
-                logger.info(f"取消 {chat_id} 的股票分析任务")
+        # 给未完成的分析任务一段宽限时间，超时仍未结束的再取消
+        running = {task: chat_id for chat_id, task in self.analysis_tasks.items() if not task.done()}
+        if running:
+            _, pending = await asyncio.wait(running, timeout=self.SHUTDOWN_GRACE_PERIOD)
+            for task in pending:
+                logger.info(f"取消 {running[task]} 的股票分析任务")
                 task.cancel()
-                try:
-                    await task
-                except asyncio.CancelledError:
-                    logger.info(f"{chat_id} 的股票分析任务已取消")
-                except Exception as e:
-                    logger.exception(f"取消 {chat_id} 的股票分析任务时出错: {e}")
+            for task, result in zip(pending, await asyncio.gather(*pending, return_exceptions=True)):
+                if isinstance(result, asyncio.CancelledError):
+                    logger.info(f"{running[task]} 的股票分析任务已取消")
+                elif isinstance(result, Exception):
+                    logger.exception(f"取消 {running[task]} 的股票分析任务时出错: {result}")
         
         # 关闭HTTP会话
-        if self.http_session:
+        if self.http_session is not None and not self.http_session.closed:
             await self.http_session.close()
             logger.info("HTTP会话已关闭")
+        self.http_session = None
         
         logger.info("StockAnalysis 插件已关闭")
 
     @on_text_message
     async def handle_text_message(self, bot: WechatAPIClient, message: Dict) -> bool:
         """处理文本消息，检查是否是股票分析命令。"""
-        if not self.enable:
-            return True  # 插件未启用，允许其他插件处理
-        
-        chat_id = message["FromWxid"]
-        content = message["Content"]
-        
-        # 检查是否为股票分析命令
-        match = re.match(self.STOCK_COMMAND_PATTERN, content)
-        if match:
-            command, stock_code = match.groups()
-            
-            # 检查是否正在进行分析
-            if chat_id in self.analysis_tasks and not self.analysis_tasks[chat_id].done():
-                try:
-                    await bot.send_text_message(chat_id, "已有一个分析任务正在进行，请稍后再试。")
-                except Exception as e:
-                    logger.exception(f"发送消息失败: {e}")
-                return False  # 阻止其他插件处理
-            
-            # 发送等待消息
-            try:
-                await bot.send_text_message(chat_id, self.ANALYSIS_IN_PROGRESS_PROMPT)
-            except Exception as e:
-                logger.exception(f"发送等待消息失败: {e}")
-            
-            # 创建分析任务
-            self.analysis_tasks[chat_id] = asyncio.create_task(
-                self._analyze_stock(bot, chat_id, stock_code)
-            )
-            logger.info(f"创建股票 {stock_code} 的分析任务")
-            return False  # 阻止其他插件处理
-            
-        return True  # 不是分析命令，允许其他插件处理
+        return await self._try_handle_stock_cmd(bot, message, strip_at=False)
 
     @on_at_message
     async def handle_at_message(self, bot: WechatAPIClient, message: Dict) -> bool:
         """处理@消息，检查是否包含股票分析命令。"""
+        return await self._try_handle_stock_cmd(bot, message, strip_at=True)
+
+    async def _try_handle_stock_cmd(self, bot: WechatAPIClient, message: Dict, strip_at: bool) -> bool:
+        """检查消息是否为股票分析命令，是则创建分析任务。返回 False 表示阻止其他插件处理。"""
         if not self.enable:
             return True  # 插件未启用，允许其他插件处理
-            
+        
         chat_id = message["FromWxid"]
         content = message["Content"]
         
-        # 移除@标记和特殊字符，仅保留实际文本内容
-        # 注意：这里可能需要根据实际的@消息格式进行调整
-        content = re.sub(r'@\S+\s+', '', content).strip()
+        if strip_at:
+            # 移除@标记和特殊字符，仅保留实际文本内容，没有@时不进入正则
+            # 注意：这里可能需要根据实际的@消息格式进行调整
+            if '@' in content:
+                content = _AT_STRIP_RE.sub('', content)
+            content = content.strip()
         
         # 检查是否为股票分析命令
-        match = re.match(self.STOCK_COMMAND_PATTERN, content)
+        match = _CMD_RE.match(content)
         if match:
             command, stock_code = match.groups()
             
@@ -193,6 +396,114 @@ class StockAnalysis(PluginBase):
             
         return True  # 不是分析命令，允许其他插件处理
 
+    async def _ak_call(self, fn, *args, **kwargs):
+        """在线程中执行 AkShare 调用：限制并发、控制调用间隔，遇到限流类错误时指数退避重试"""
+        for attempt in range(self.AK_MAX_RETRIES + 1):
+            async with self._ak_sem:
+                # 为本次调用预约开始时间，相邻调用至少间隔 AK_MIN_INTERVAL 秒
+                now = time.monotonic()
+                start = max(now, self._ak_next_slot)
+                self._ak_next_slot = start + self.AK_MIN_INTERVAL
+                if start > now:
+                    await asyncio.sleep(start - now)
+                try:
+                    return await asyncio.to_thread(fn, *args, **kwargs)
+                except Exception as e:
+                    message = str(e)
+                    if attempt >= self.AK_MAX_RETRIES or not any(m in message for m in self.AK_RETRY_MARKERS):
+                        raise
+                    delay = 2 ** attempt
+                    self.logger.warning(f"AkShare 调用 {getattr(fn, '__name__', fn)} 失败，{delay}秒后第{attempt + 1}次重试: {message}")
+            # 退避等待时释放并发名额
+            await asyncio.sleep(delay)
+
+    @staticmethod
+    def _market_clock(market_type: str):
+        """返回 (市场当地时间, 交易时段)，未知市场类型按A股处理"""
+        tz_name, sessions = _MARKET_SESSIONS.get(market_type, _A_SESSIONS)
+        return datetime.now(_MARKET_TZ[tz_name]), sessions
+
+    @classmethod
+    def _is_trading_time(cls, market_type: str = 'A') -> bool:
+        """当前是否处于该市场的交易时段"""
+        now, sessions = cls._market_clock(market_type)
+        if now.weekday() >= 5:
+            return False
+        hhmm = now.hour * 100 + now.minute
+        return any(start <= hhmm <= end for start, end in sessions)
+
+    def _frame_expiry(self, market_type: str) -> float:
+        """写入行情缓存时确定的过期时间（Unix时间戳）
+
+        交易时段内写入的数据含未收盘的K线，短时间后过期；休市时写入的数据保留到下一个交易时段开始
+        """
+        now, sessions = self._market_clock(market_type)
+        ts = now.timestamp()
+        opening_day = None
+        if now.weekday() < 5:
+            hhmm = now.hour * 100 + now.minute
+            for start, end in sessions:
+                if start <= hhmm <= end:
+                    return ts + self.DATA_CACHE_TTL_TRADING
+                if hhmm < start:
+                    opening_day = now
+                    break
+        if opening_day is None:
+            # 当日已收盘或休市：下一个工作日的第一个交易时段开盘时过期
+            start = sessions[0][0]
+            opening_day = now + timedelta(days=1)
+            while opening_day.weekday() >= 5:
+                opening_day += timedelta(days=1)
+        opening = opening_day.replace(hour=start // 100, minute=start % 100, second=0, microsecond=0)
+        return min(opening.timestamp(), ts + self.DATA_CACHE_TTL_IDLE)
+
+    async def _get_a_share_spot(self):
+        """获取A股实时行情快照，返回 (DataFrame, 代码 -> 行号)，缓存过期前不重复下载全表"""
+        async with self._spot_lock:
+            ttl = self.SPOT_CACHE_TTL_TRADING if self._is_trading_time() else self.SPOT_CACHE_TTL_IDLE
+            if self._spot_cache is None or time.monotonic() - self._spot_cache_ts > ttl:
+                stock_info = await self._ak_call(self.ak.stock_zh_a_spot_em)
+                if stock_info.empty:
+                    return stock_info, {}
+                # 只建立代码到行号的索引，不为5000行逐一生成字典
+                codes = map(_normalize_code, stock_info['代码'].values)
+                self._spot_cache = (stock_info, dict(zip(codes, range(len(stock_info)))))
+                self._spot_cache_ts = time.monotonic()
+                self._a_codes = frozenset(self._spot_cache[1])
+                self._a_codes_expires = self._spot_cache_ts + self.A_CODES_TTL
+            return self._spot_cache
+
+    async def _get_a_codes(self) -> frozenset:
+        """获取A股代码集合，10分钟内直接复用，过期后才从行情快照重建"""
+        if time.monotonic() < self._a_codes_expires:
+            return self._a_codes
+        _, spot_index = await self._get_a_share_spot()
+        if spot_index:
+            self._a_codes = frozenset(spot_index)
+            self._a_codes_expires = time.monotonic() + self.A_CODES_TTL
+        return self._a_codes
+
+    async def _get_name_map(self, source: str) -> Dict[str, str]:
+        """获取某个来源的 代码 -> 名称 映射，缓存过期前不重复下载全表"""
+        cached = self._name_cache.get(source)
+        if cached is not None and time.monotonic() < cached[0]:
+            return cached[1]
+        async with self._name_locks[source]:
+            # 等锁期间可能已被其他请求刷新
+            cached = self._name_cache.get(source)
+            if cached is not None and time.monotonic() < cached[0]:
+                return cached[1]
+            fn_name, code_col, name_col = _NAME_SOURCES[source]
+            df = await self._ak_call(getattr(self.ak, fn_name))
+            # 代码统一规范化后作为键，与规范化后的用户输入直接比较
+            names = {} if df.empty else dict(zip(map(_normalize_code, df[code_col].values), df[name_col].values))
+            self._name_cache[source] = (time.monotonic() + self.NAME_CACHE_TTL, names)
+            return names
+
+    async def _get_name(self, source: str, code: str) -> str:
+        """查询代码对应的名称，查不到时返回空字符串"""
+        return (await self._get_name_map(source)).get(code, "")
+
     async def _get_stock_data(self, stock_code: str, market_type: str = "A"):
         """获取股票数据"""
         try:
@@ -200,12 +511,13 @@ class StockAnalysis(PluginBase):
                 self.logger.info(f"正在获取A股数据: {stock_code}")
                 
                 # 获取更长时间的历史数据
-                end_date = datetime.now().strftime("%Y%m%d")
-                start_date = (datetime.now() - timedelta(days=180)).strftime("%Y%m%d")
+                now = datetime.now()
+                end_date = now.strftime("%Y%m%d")
+                start_date = (now - timedelta(days=180)).strftime("%Y%m%d")
                 
                 try:
                     # 尝试获取股票名称和状态
-                    stock_info = self.ak.stock_zh_a_spot_em()
+                    stock_info, spot_index = await self._get_a_share_spot()
                     stock_name = ""  # 初始化股票名称变量
                     actual_code = stock_code  # 默认使用原始代码
                     
@@ -214,20 +526,18 @@ class StockAnalysis(PluginBase):
                         padded_code = stock_code.zfill(6)
                         self.logger.info(f"查询股票信息，原始代码: {stock_code}, 补齐后代码: {padded_code}")
                         
-                        # 打印所有可用的股票代码用于调试
-                        available_codes = stock_info['代码'].tolist()
-                        self.logger.info(f"数据源中包含的部分股票代码: {available_codes[:10]}...")
+                        # 打印部分可用的股票代码用于调试
+                        self.logger.debug(f"数据源中包含的部分股票代码: {stock_info['代码'].head(10).tolist()}...")
                         
-                        # 检查股票代码是否存在
-                        stock_match = stock_info[stock_info['代码'] == padded_code]
-                        if stock_match.empty:
-                            # 尝试直接使用原始代码
-                            stock_match = stock_info[stock_info['代码'] == stock_code]
-                            if stock_match.empty:
-                                self.logger.error(f"股票代码 {stock_code} 不存在于数据源中")
-                                return None
-                            
-                        stock_name = stock_match.iloc[0]['名称']
+                        # 检查股票代码是否存在，不存在时尝试直接使用原始代码
+                        row_pos = spot_index.get(padded_code)
+                        if row_pos is None:
+                            row_pos = spot_index.get(stock_code)
+                        if row_pos is None:
+                            self.logger.error(f"股票代码 {stock_code} 不存在于数据源中")
+                            return None
+                        # 按行号直接取单元格，不为整行构造 Series
+                        stock_name = stock_info['名称'].iat[row_pos]
                         self.logger.info(f"找到股票: {stock_name}")
                         
                         if '退市' in stock_name or 'ST' in stock_name:
@@ -235,12 +545,13 @@ class StockAnalysis(PluginBase):
                             return None
                             
                         # 使用找到的实际代码
-                        actual_code = stock_match.iloc[0]['代码']
+                        actual_code = stock_info['代码'].iat[row_pos]
                         self.logger.info(f"使用实际代码获取数据: {actual_code}")
                     
                     # 使用东方财富数据源
                     self.logger.info(f"使用东方财富数据源获取数据... 时间范围: {start_date} 至 {end_date}")
-                    df = self.ak.stock_zh_a_hist(
+                    df = await self._ak_call(
+                        self.ak.stock_zh_a_hist,
                         symbol=actual_code,  # 使用实际代码
                         period="daily",
                         start_date=start_date,
@@ -255,8 +566,9 @@ class StockAnalysis(PluginBase):
                     # 检查数据量是否足够
                     if len(df) < 60:  # 如果数据少于60天，尝试获取更长时间的数据
                         self.logger.info("数据量不足，尝试获取更长时间的数据...")
-                        start_date = (datetime.now() - timedelta(days=365)).strftime("%Y%m%d")  # 扩展到一年
-                        df = self.ak.stock_zh_a_hist(
+                        start_date = (now - timedelta(days=365)).strftime("%Y%m%d")  # 扩展到一年
+                        df = await self._ak_call(
+                            self.ak.stock_zh_a_hist,
                             symbol=actual_code,
                             period="daily",
                             start_date=start_date,
@@ -313,7 +625,7 @@ class StockAnalysis(PluginBase):
                     # 尝试使用备用数据源
                     try:
                         self.logger.info("尝试使用新浪财经数据源...")
-                        df = self.ak.stock_zh_a_daily(symbol=stock_code, adjust="qfq")
+                        df = await self._ak_call(self.ak.stock_zh_a_daily, symbol=stock_code, adjust="qfq")
                         if not df.empty:
                             # 在备用数据源中也添加股票信息
                             df.attrs['stock_name'] = "未知"  # 备用数据源可能无法获取股票名称
@@ -330,26 +642,43 @@ class StockAnalysis(PluginBase):
     def _calculate_indicators(self, df):
         """计算技术指标"""
         try:
-            # 计算RSI
-            delta = df['close'].diff()
-            gain = (delta.where(delta > 0, 0)).rolling(window=14).mean()
-            loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
-            rs = gain / loss
-            df['RSI'] = 100 - (100 / (1 + rs))
-            
-            # 计算MACD
-            exp1 = df['close'].ewm(span=12, adjust=False).mean()
-            exp2 = df['close'].ewm(span=26, adjust=False).mean()
-            df['MACD'] = exp1 - exp2
-            df['Signal'] = df['MACD'].ewm(span=9, adjust=False).mean()
-            
-            # 计算MA
-            df['MA5'] = df['close'].rolling(window=5).mean()
-            df['MA10'] = df['close'].rolling(window=10).mean()
-            df['MA20'] = df['close'].rolling(window=20).mean()
-            
-            # 计算波动率
-            df['Volatility'] = df['close'].pct_change().rolling(window=20).std() * np.sqrt(252) * 100
+            # 数据只有几十到几百行，直接在 NumPy 数组上计算，避免 pandas 逐步生成中间 Series
+            close = df['close'].to_numpy(dtype=np.float64)
+            
+            if _indicator_kernel is not None:
+                rsi, macd, signal, ma5, ma10, ma20, volatility = _indicator_kernel(close)
+            else:
+                # 计算RSI（首日涨跌记为0）
+                delta = np.diff(close, prepend=close[0])
+                gain = _rolling_mean(np.maximum(delta, 0), 14)
+                loss = _rolling_mean(-np.minimum(delta, 0), 14)
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    rsi = 100 - (100 / (1 + gain / loss))
+                
+                # 计算MACD
+                exp1 = df['close'].ewm(span=12, adjust=False).mean()
+                exp2 = df['close'].ewm(span=26, adjust=False).mean()
+                macd = exp1 - exp2
+                signal = macd.ewm(span=9, adjust=False).mean()
+                
+                # 计算MA
+                ma5 = _rolling_mean(close, 5)
+                ma10 = _rolling_mean(close, 10)
+                ma20 = _rolling_mean(close, 20)
+                
+                # 计算波动率：20日收益率标准差年化
+                returns = close[1:] / close[:-1] - 1
+                volatility = np.full(close.shape, np.nan)
+                if len(returns) >= 20:
+                    volatility[20:] = sliding_window_view(returns, 20).std(axis=1, ddof=1) * np.sqrt(252) * 100
+            
+            df['RSI'] = rsi
+            df['MACD'] = macd
+            df['Signal'] = signal
+            df['MA5'] = ma5
+            df['MA10'] = ma10
+            df['MA20'] = ma20
+            df['Volatility'] = volatility
             
             return df
             
@@ -360,33 +689,38 @@ class StockAnalysis(PluginBase):
     def _analyze_indicators(self, df):
         """分析技术指标生成报告"""
         try:
-            latest = df.iloc[-1]
+            # 按列位置直接读取最后一行的值，不构造整行 Series
+            col_idx = {col: i for i, col in enumerate(df.columns)}
+            last_row = len(df) - 1
+            
+            def latest(col):
+                return df.iat[last_row, col_idx[col]]
             
             # 趋势分析
-            trend = "上升" if latest['MA5'] > latest['MA20'] else "下降"
+            trend = "上升" if latest('MA5') > latest('MA20') else "下降"
             
             # 波动性分析
-            volatility = float(latest['Volatility'])
+            volatility = float(latest('Volatility'))
             
             # RSI分析
-            rsi = float(latest['RSI'])
+            rsi = float(latest('RSI'))
             rsi_signal = "超买" if rsi > 70 else "超卖" if rsi < 30 else "中性"
             
             # MACD分析
-            macd_signal = "买入" if latest['MACD'] > latest['Signal'] else "卖出"
+            macd_signal = "买入" if latest('MACD') > latest('Signal') else "卖出"
             
             # 成交量分析
             volume_trend = "放量" if df['volume'].iloc[-5:].mean() > df['volume'].iloc[-20:].mean() else "缩量"
             
             # 获取最新市场数据
-            latest_price = float(latest['close'])
-            latest_change = float(df['change_pct'].iloc[-1]) if 'change_pct' in df.columns else 0.0
-            latest_turnover = float(df['turnover_rate'].iloc[-1]) if 'turnover_rate' in df.columns else 0.0
+            latest_price = float(latest('close'))
+            latest_change = float(latest('change_pct')) if 'change_pct' in col_idx else 0.0
+            latest_turnover = float(latest('turnover_rate')) if 'turnover_rate' in col_idx else 0.0
             
             # 获取均线数据
-            ma5 = float(latest['MA5'])
-            ma10 = float(latest['MA10'])
-            ma20 = float(latest['MA20'])
+            ma5 = float(latest('MA5'))
+            ma10 = float(latest('MA10'))
+            ma20 = float(latest('MA20'))
             
             # 计算综合得分(0-100)
             score = 0
@@ -463,21 +797,25 @@ MA10：{data['analysis']['ma10']:.2f}
 MA20：{data['analysis']['ma20']:.2f}
 
 4. 技术指标趋势（最近20个交易日）：
-RSI趋势：{', '.join([f'{x:.2f}' for x in data['indicators']['RSI'][-20:]])}
-MACD趋势：{', '.join([f'{x:.2f}' for x in data['indicators']['MACD'][-20:]])}
-MACD信号线：{', '.join([f'{x:.2f}' for x in data['indicators']['Signal'][-20:]])}
-MA5趋势：{', '.join([f'{x:.2f}' for x in data['indicators']['MA5'][-20:]])}
-MA10趋势：{', '.join([f'{x:.2f}' for x in data['indicators']['MA10'][-20:]])}
-MA20趋势：{', '.join([f'{x:.2f}' for x in data['indicators']['MA20'][-20:]])}
-波动率趋势：{', '.join([f'{x:.2f}' for x in data['indicators']['Volatility'][-20:]])}
+RSI趋势：{', '.join(f'{x:.2f}' for x in data['indicators']['RSI'][-20:])}
+MACD趋势：{', '.join(f'{x:.2f}' for x in data['indicators']['MACD'][-20:])}
+MACD信号线：{', '.join(f'{x:.2f}' for x in data['indicators']['Signal'][-20:])}
+MA5趋势：{', '.join(f'{x:.2f}' for x in data['indicators']['MA5'][-20:])}
+MA10趋势：{', '.join(f'{x:.2f}' for x in data['indicators']['MA10'][-20:])}
+MA20趋势：{', '.join(f'{x:.2f}' for x in data['indicators']['MA20'][-20:])}
+波动率趋势：{', '.join(f'{x:.2f}' for x in data['indicators']['Volatility'][-20:])}
 
 5. 历史数据（近一个月交易日）：
 """
-            # 添加近一个月的历史数据
-            for record in data['historical_data'][-20:]:
-                raw_data_text += f"日期：{record['date']}, 开盘：{record['open']:.4f}, 收盘：{record['close']:.4f}, "
-                raw_data_text += f"最高：{record['high']:.4f}, 最低：{record['low']:.4f}, "
-                raw_data_text += f"成交量：{record['volume']}, 涨跌幅：{record.get('change_pct', 0):.2f}%\n"
+            # 添加近一个月的历史数据，先收集各行再一次拼接
+            parts = [raw_data_text]
+            parts.extend(
+                f"日期：{date}, 开盘：{open_price:.4f}, 收盘：{close_price:.4f}, "
+                f"最高：{high:.4f}, 最低：{low:.4f}, "
+                f"成交量：{volume}, 涨跌幅：{change_pct:.2f}%\n"
+                for date, open_price, close_price, high, low, volume, change_pct in data['historical_data'][-20:]
+            )
+            raw_data_text = ''.join(parts)
             
             # 准备发送给 dify 的数据
             payload = {
@@ -507,22 +845,23 @@ MA20趋势：{', '.join([f'{x:.2f}' for x in data['indicators']['MA20'][-20:]])}
    - 设置合理的止损位和目标价位
 
 请结合所有数据，给出专业、具体且可操作的建议。""",
-                "response_mode": "blocking",
+                "response_mode": "streaming",
                 "conversation_id": None,
                 "user": "stock_analysis"
             }
             
             url = f"{self.dify_base_url}/chat-messages"
-            async with self.http_session.post(
+            session = await self._get_session()
+            async with session.post(
                 url=url,
                 headers=headers,
                 json=payload,
                 proxy=self.http_proxy if self.http_proxy else None
             ) as response:
                 if response.status == 200:
-                    result = await response.json()
-                    answer = result.get("answer", "")
-                    self.logger.info("成功从 Dify API 获取分析结果")
+                    result = await self._read_dify_stream(response)
+                    if result is not None:
+                        self.logger.info("成功从 Dify API 获取分析结果")
                     return result
                 else:
                     error_msg = await response.text()
@@ -533,6 +872,36 @@ MA20趋势：{', '.join([f'{x:.2f}' for x in data['indicators']['MA20'][-20:]])}
             self.logger.error(f"与 Dify 通信时发生错误: {e}")
             return None
 
+    async def _read_dify_stream(self, response: aiohttp.ClientResponse) -> Optional[Dict]:
+        """
+        读取 Dify 的 SSE 流式响应，拼接各段 answer
+        
+        Returns:
+            与阻塞模式相同结构的结果字典（包含 answer），出错时返回 None
+        """
+        answer_parts = []
+        result = {}
+        async for raw_line in response.content:
+            line = raw_line.strip()
+            if not line.startswith(b"data:"):
+                continue
+            try:
+                event = json.loads(line[5:])
+            except ValueError:
+                continue
+            event_type = event.get("event")
+            if event_type in ("message", "agent_message"):
+                answer_parts.append(event.get("answer", ""))
+            elif event_type == "message_end":
+                result["conversation_id"] = event.get("conversation_id")
+                result["message_id"] = event.get("message_id")
+                break
+            elif event_type == "error":
+                self.logger.error(f"Dify 流式响应出错: {event.get('status')} - {event.get('message')}")
+                return None
+        result["answer"] = "".join(answer_parts)
+        return result
+
     def _text_to_image(self, text: str, title: str = "") -> bytes:
         """
         将文本转换为图片
@@ -545,21 +914,16 @@ MA20趋势：{', '.join([f'{x:.2f}' for x in data['indicators']['MA20'][-20:]])}
             图片的二进制数据
         """
         try:
-            # 设置字体
-            if self.font_path and os.path.exists(self.font_path):
-                title_font = ImageFont.truetype(self.font_path, 40)
-                content_font = ImageFont.truetype(self.font_path, 30)
-            else:
-                # 使用默认字体
-                title_font = ImageFont.load_default()
-                content_font = ImageFont.load_default()
+            title_font = self._title_font
+            content_font = self._content_font
+            watermark_font = self._watermark_font
             
             # 计算图片大小
             padding = 50
             line_spacing = 10
             
-            # 分割文本为行
-            lines = text.split('\n')
+            # 去掉空行后整体排版，一次测量、一次绘制
+            text = '\n'.join(line for line in text.split('\n') if line.strip())
             
             # 创建临时图片来计算文本大小
             temp_img = Image.new('RGB', (1, 1), color='white')
@@ -573,20 +937,17 @@ MA20趋势：{', '.join([f'{x:.2f}' for x in data['indicators']['MA20'][-20:]])}
             else:
                 title_w, title_h = 0, 0
             
-            # 计算每行文本的大小
-            max_line_width = 0
-            total_height = title_h + padding if title else padding
-            
-            for line in lines:
-                if line.strip():
-                    bbox = temp_draw.textbbox((0, 0), line, font=content_font)
-                    w = bbox[2] - bbox[0]
-                    h = bbox[3] - bbox[1]
-                    max_line_width = max(max_line_width, w)
-                    total_height += h + line_spacing
+            # 计算正文大小
+            if text:
+                text_bbox = temp_draw.multiline_textbbox((0, 0), text, font=content_font, spacing=line_spacing)
+                text_w = text_bbox[2] - text_bbox[0]
+                text_h = text_bbox[3] + line_spacing
+            else:
+                text_w, text_h = 0, 0
+            total_height = (title_h + padding if title else padding) + text_h
             
             # 设置图片大小
-            width = max(max_line_width + padding * 2, title_w + padding * 2)
+            width = max(text_w + padding * 2, title_w + padding * 2)
             height = total_height + padding
             
             # 创建图片
@@ -602,16 +963,11 @@ MA20趋势：{', '.join([f'{x:.2f}' for x in data['indicators']['MA20'][-20:]])}
                 current_y = padding
             
             # 绘制正文
-            for line in lines:
-                if line.strip():
-                    bbox = draw.textbbox((0, 0), line, font=content_font)
-                    h = bbox[3] - bbox[1]
-                    draw.text((padding, current_y), line, font=content_font, fill='black')
-                    current_y += h + line_spacing
+            if text:
+                draw.multiline_text((padding, current_y), text, font=content_font, spacing=line_spacing, fill='black')
             
             # 添加水印
             watermark = "老夏的金库"
-            watermark_font = ImageFont.truetype(self.font_path, 20) if self.font_path else ImageFont.load_default()
             watermark_bbox = draw.textbbox((0, 0), watermark, font=watermark_font)
             w = watermark_bbox[2] - watermark_bbox[0]
             h = watermark_bbox[3] - watermark_bbox[1]
@@ -620,7 +976,8 @@ MA20趋势：{', '.join([f'{x:.2f}' for x in data['indicators']['MA20'][-20:]])}
             
             # 转换为字节流
             img_byte_arr = io.BytesIO()
-            img.save(img_byte_arr, format='PNG')
+            # 图片只是临时发送，使用最低压缩级别换取更快的编码速度
+            img.save(img_byte_arr, format='PNG', compress_level=1)
             img_byte_arr = img_byte_arr.getvalue()
             
             return img_byte_arr
@@ -629,33 +986,110 @@ MA20趋势：{', '.join([f'{x:.2f}' for x in data['indicators']['MA20'][-20:]])}
             self.logger.exception(f"生成图片失败: {e}")
             return None
 
+    async def _get_cached_frame(self, cache_key):
+        """返回未过期的缓存数据，后续分析只读取不修改"""
+        cached = self._df_cache.get(cache_key)
+        if cached is not None:
+            if time.time() < cached[0]:
+                return cached[1]
+            del self._df_cache[cache_key]
+        
+        # 内存未命中时读取磁盘缓存；反序列化整张表较慢，放到线程中执行
+        cached = await asyncio.to_thread(self._read_disk_cache, self._disk_cache_path(cache_key))
+        if cached is None or time.time() >= cached[0]:
+            return None
+        self._df_cache[cache_key] = cached
+        return cached[1]
+
+    async def _cache_frame(self, cache_key, df):
+        """缓存数据，同时清理已过期的条目"""
+        now = time.time()
+        for key in [key for key, (expires_at, _) in self._df_cache.items() if expires_at <= now]:
+            del self._df_cache[key]
+        entry = (self._frame_expiry(cache_key[1]), df)
+        self._df_cache[cache_key] = entry
+        await asyncio.to_thread(self._write_disk_cache, self._disk_cache_path(cache_key), entry)
+
+    def _read_disk_cache(self, path):
+        """读取磁盘缓存，返回 (过期时间戳, DataFrame)；文件不存在或格式不符时返回 None"""
+        try:
+            with open(path, "rb") as f:
+                entry = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            self.logger.warning(f"读取磁盘缓存失败 {path}: {e}")
+            return None
+        # 旧版本只保存了 DataFrame，没有过期时间，视为未命中
+        if not isinstance(entry, tuple) or len(entry) != 2:
+            return None
+        return entry
+
+    def _write_disk_cache(self, path, entry):
+        """写入 (过期时间戳, DataFrame)
+
+        pickle 会保留 df.attrs 中的名称和市场类型；先写临时文件再替换，避免读到写了一半的文件
+        """
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(self._cache_dir, exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            self.logger.warning(f"写入磁盘缓存失败 {path}: {e}")
+
+    def _disk_cache_path(self, cache_key) -> str:
+        """磁盘缓存文件路径：日期_市场类型_代码.pkl"""
+        code, market_type, day = cache_key
+        return os.path.join(self._cache_dir, f"{day}_{market_type}_{code}.pkl")
+
+    def _prune_disk_cache(self):
+        """删除超过 data_cache_days 天的磁盘缓存文件"""
+        if not os.path.isdir(self._cache_dir):
+            return
+        cutoff = time.time() - self.data_cache_days * 24 * 3600
+        for entry in os.scandir(self._cache_dir):
+            try:
+                if entry.is_file() and entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+            except OSError as e:
+                self.logger.warning(f"清理磁盘缓存失败 {entry.path}: {e}")
+
     async def _analyze_stock(self, bot: WechatAPIClient, chat_id: str, code: str) -> None:
+        dify_task = None
+        code = _normalize_code(code)
         try:
             logger.info(f"开始分析 {code}")
             
             # 判断代码类型
-            market_type = self._determine_market_type(code)
-            
-            # 获取数据
-            df = None
-            if market_type == 'A':
-                df = await self._get_stock_data(code, market_type)
-            elif market_type == 'HK':
-                df = await self._get_hk_stock_data(code)
-            elif market_type == 'US':
-                df = await self._get_us_stock_data(code)
-            elif market_type in ['ETF', 'LOF']:
-                df = await self._get_fund_data(code, market_type)
-                
-            if df is None:
-                await bot.send_text_message(chat_id, f"无法获取 {code} 的数据，请确认代码是否正确。")
-                return
-                
-            # 计算指标
-            df = self._calculate_indicators(df)
+            market_type = await self._determine_market_type(code)
+            
+            # 同一只股票短时间内重复分析时直接复用已计算好指标的数据
+            # 日期按该市场当地时间计算，美股收盘后写入的数据不会被算作服务器所在时区的次日数据
+            cache_key = (code, market_type, self._market_clock(market_type)[0].date().isoformat())
+            df = await self._get_cached_frame(cache_key)
             if df is None:
-                await bot.send_text_message(chat_id, f"无法计算 {code} 的技术指标。")
-                return
+                # 获取数据
+                if market_type == 'A':
+                    df = await self._get_stock_data(code, market_type)
+                elif market_type == 'HK':
+                    df = await self._get_hk_stock_data(code)
+                elif market_type == 'US':
+                    df = await self._get_us_stock_data(code)
+                elif market_type in ['ETF', 'LOF']:
+                    df = await self._get_fund_data(code, market_type)
+                    
+                if df is None:
+                    await bot.send_text_message(chat_id, f"无法获取 {code} 的数据，请确认代码是否正确。")
+                    return
+                    
+                # 计算指标；首次调用时 numba 需要编译内核，放到线程中执行，不阻塞事件循环
+                df = await asyncio.to_thread(self._calculate_indicators, df)
+                if df is None:
+                    await bot.send_text_message(chat_id, f"无法计算 {code} 的技术指标。")
+                    return
+                await self._cache_frame(cache_key, df)
                 
             # 生成分析报告
             analysis = self._analyze_indicators(df)
@@ -677,6 +1111,10 @@ MA20趋势：{', '.join([f'{x:.2f}' for x in data['indicators']['MA20'][-20:]])}
             
             self.logger.info(f"最终使用的股票名称: '{analysis['name']}'")
             
+            # 最近20个交易日的指标，一次切片后按列拆分
+            indicator_cols = ['RSI', 'MACD', 'Signal', 'MA5', 'MA10', 'MA20', 'Volatility']
+            indicator_rows = df[indicator_cols].tail(20).to_numpy(dtype=np.float64)
+            
             # 准备发送给 Dify 的数据
             stock_data = {
                 'code': code,
@@ -684,16 +1122,9 @@ MA20趋势：{', '.join([f'{x:.2f}' for x in data['indicators']['MA20'][-20:]])}
                 'name': analysis['name'],
                 'currency': analysis['currency'],
                 'analysis': analysis,
-                'indicators': {
-                    'RSI': df['RSI'].tail(20).tolist(),
-                    'MACD': df['MACD'].tail(20).tolist(),
-                    'Signal': df['Signal'].tail(20).tolist(),
-                    'MA5': df['MA5'].tail(20).tolist(),
-                    'MA10': df['MA10'].tail(20).tolist(),
-                    'MA20': df['MA20'].tail(20).tolist(),
-                    'Volatility': df['Volatility'].tail(20).tolist()
-                },
-                'historical_data': df[['date', 'open', 'close', 'high', 'low', 'volume', 'change_pct']].tail(60).to_dict('records')
+                'indicators': dict(zip(indicator_cols, indicator_rows.T.tolist())),
+                # 每行依次为 HISTORY_COLUMNS 各列，缺少的列（如美股的涨跌幅）填0
+                'historical_data': df.tail(60).reindex(columns=self.HISTORY_COLUMNS, fill_value=0).to_numpy()
             }
             
             # 异步发送数据到 dify
@@ -705,7 +1136,8 @@ MA20趋势：{', '.join([f'{x:.2f}' for x in data['indicators']['MA20'][-20:]])}
             # 将分析结果转换为图片
             stock_name = analysis['name'] if analysis['name'] else code
             title = f"{stock_name}({code}) 分析报告"
-            img_data = self._text_to_image(formatted_result, title)
+            # 图片渲染和编码是CPU密集操作，放到线程中执行以免阻塞事件循环
+            img_data = await asyncio.to_thread(self._text_to_image, formatted_result, title)
             
             if img_data:
                 # 发送图片
@@ -714,12 +1146,13 @@ MA20趋势：{', '.join([f'{x:.2f}' for x in data['indicators']['MA20'][-20:]])}
                 # 如果图片生成失败，退回到发送文本
                 await bot.send_text_message(chat_id, formatted_result)
             
-            # 等待 dify 分析结果
+            # 等待 dify 分析结果，超时后取消请求
             try:
-                dify_result = await dify_task
+                dify_result = await asyncio.wait_for(dify_task, timeout=self.DIFY_TIMEOUT)
                 if dify_result and 'answer' in dify_result:
                     # 将AI分析结果也转换为图片
-                    ai_analysis_img = self._text_to_image(
+                    ai_analysis_img = await asyncio.to_thread(
+                        self._text_to_image,
                         dify_result['answer'],
                         f"{stock_name}({code}) AI深度分析"
                     )
@@ -727,6 +1160,8 @@ MA20趋势：{', '.join([f'{x:.2f}' for x in data['indicators']['MA20'][-20:]])}
                         await bot.send_image_message(chat_id, ai_analysis_img)
                     else:
                         await bot.send_text_message(chat_id, f"\n\n【AI 深度分析】\n{dify_result['answer']}")
+            except asyncio.TimeoutError:
+                self.logger.error(f"等待 Dify 分析结果超时（{self.DIFY_TIMEOUT}秒）")
             except Exception as e:
                 self.logger.error(f"获取 Dify 分析结果失败: {e}")
             
@@ -739,10 +1174,35 @@ MA20趋势：{', '.join([f'{x:.2f}' for x in data['indicators']['MA20'][-20:]])}
             except Exception as send_error:
                 logger.exception(f"发送错误消息失败: {send_error}")
         finally:
+            # 分析被取消或提前结束时，不再让 Dify 请求继续占用连接
+            if dify_task is not None and not dify_task.done():
+                dify_task.cancel()
             if chat_id in self.analysis_tasks:
                 del self.analysis_tasks[chat_id]
 
-    def _determine_market_type(self, stock_code: str) -> str:
+    @staticmethod
+    @lru_cache(maxsize=4096)
+    def _classify_code(stock_code: str) -> Optional[str]:
+        """
+        只按代码规则判断市场类型，结果只取决于代码本身，可以直接缓存
+        
+        Returns:
+            'HK'/'US' 为确定结果；'A'/'ETF'/'LOF' 为前缀候选，仍需进一步验证；None 表示规则无法判断
+        """
+        # 港股市场
+        if len(stock_code) == 5 and stock_code.isdigit():
+            return 'HK'
+        # 美股市场：A股、港股和各类基金代码都是纯数字，含字母的只能是美股代码
+        if not stock_code.isdigit():
+            return 'US'
+        # 按代码前缀查表，替代逐个 startswith 判断
+        return _CODE_PREFIX_MARKET.get(stock_code[:2])
+
+    async def _verify_a(self, stock_code: str) -> bool:
+        """验证代码是否在A股代码集合中（代码集合有缓存）"""
+        return stock_code in await self._get_a_codes()
+
+    async def _determine_market_type(self, stock_code: str) -> str:
         """
         根据股票代码确定市场类型
         
@@ -752,69 +1212,50 @@ MA20趋势：{', '.join([f'{x:.2f}' for x in data['indicators']['MA20'][-20:]])}
         Returns:
             市场类型: 'A'(A股), 'HK'(港股), 'US'(美股), 'ETF', 'LOF', 'FUND'(其他基金)
         """
+        stock_code = _normalize_code(stock_code)
         try:
-            # 首先尝试从基金列表中查找
-            try:
-                # 检查是否为普通基金
-                fund_info = self.ak.fund_open_fund_info_em(fund=stock_code)
-                if not fund_info.empty:
-                    return 'FUND'
-                    
-                # 检查是否为ETF
-                etf_info = self.ak.fund_etf_spot_em()
-                if not etf_info.empty and stock_code in etf_info['代码'].values:
-                    return 'ETF'
-                    
-                # 检查是否为LOF
-                lof_info = self.ak.fund_lof_spot_em()
-                if not lof_info.empty and stock_code in lof_info['代码'].values:
-                    return 'LOF'
-            except Exception as e:
-                self.logger.warning(f"基金类型检查失败: {e}")
-        
-            # 如果不是基金，则按照股票代码规则判断
-            if (
-                stock_code.startswith('60') or  # 上海主板
-                stock_code.startswith('00') or  # 深圳主板
-                stock_code.startswith('30') or  # 创业板
-                stock_code.startswith('68') or  # 科创板
-                stock_code.startswith('002') or # 中小板
-                stock_code.startswith('003') or # 深圳主板
-                stock_code.startswith('001') or # 深圳主板
-                stock_code.startswith('004') or # 深圳主板
-                stock_code.startswith('005')    # 深圳主板
-            ):
+            # 先按代码规则判断，只有规则无法确定时才查询基金列表
+            prefix_market = self._classify_code(stock_code)
+            if prefix_market in ('HK', 'US'):
+                return prefix_market
+            
+            if prefix_market == 'A':
                 # 进一步验证A股
                 try:
-                    stock_info = self.ak.stock_zh_a_spot_em()
-                    if not stock_info.empty and stock_code in stock_info['代码'].values:
+                    if await self._verify_a(stock_code):
                         return 'A'
                 except Exception as e:
                     self.logger.warning(f"A股验证失败: {e}")
+            
+            # 尝试从基金列表中查找，三个查询互不依赖，并发执行；ETF/LOF 列表使用缓存的代码映射
+            fund_info, etf_names, lof_names = await asyncio.gather(
+                self._ak_call(self.ak.fund_open_fund_info_em, fund=stock_code),
+                self._get_name_map('ETF'),
+                self._get_name_map('LOF'),
+                return_exceptions=True
+            )
+            for info in (fund_info, etf_names, lof_names):
+                if isinstance(info, Exception):
+                    self.logger.warning(f"基金类型检查失败: {info}")
+            
+            # 检查是否为普通基金
+            if not isinstance(fund_info, Exception) and not fund_info.empty:
+                return 'FUND'
                 
-            # 基金代码规则
-            if (
-                stock_code.startswith('51') or  # 上海ETF
-                stock_code.startswith('56') or  # 上海ETF
-                stock_code.startswith('58') or  # 上海ETF
-                stock_code.startswith('15') or  # 深圳ETF
-                stock_code.startswith('159')    # 深圳ETF
-            ):
+            # 检查是否为ETF
+            if not isinstance(etf_names, Exception) and stock_code in etf_names:
                 return 'ETF'
-            elif (
-                stock_code.startswith('16') or  # 深圳LOF
-                stock_code.startswith('50') or  # 上海LOF
-                stock_code.startswith('501')    # 上海LOF
-            ):
+                
+            # 检查是否为LOF
+            if not isinstance(lof_names, Exception) and stock_code in lof_names:
                 return 'LOF'
-            
-            # 港股市场
-            elif len(stock_code) == 5 and stock_code.isdigit():
-                return 'HK'
+                
+            # 基金代码规则
+            if prefix_market in ('ETF', 'LOF'):
+                return prefix_market
             
             # 美股市场
-            else:
-                return 'US'
+            return 'US'
                 
         except Exception as e:
             self.logger.error(f"市场类型判断失败: {e}")
@@ -824,100 +1265,96 @@ MA20趋势：{', '.join([f'{x:.2f}' for x in data['indicators']['MA20'][-20:]])}
         """
         格式化股票分析结果为易读的文本
         """
+        def num(key: str) -> float:
+            """读取数值字段，缺失或无法转换时按0处理，单个异常值不影响整份报告"""
+            try:
+                return float(analysis.get(key) or 0)
+            except (TypeError, ValueError):
+                return 0.0
+        
         try:
-            # 构建分析结果文本
+            # 数值字段集中读取一次
+            latest_price = num('latest_price')
+            latest_change = num('latest_change')
+            latest_turnover = num('latest_turnover')
+            volatility = num('volatility')
+            rsi = num('rsi')
+            ma5, ma10, ma20 = num('ma5'), num('ma10'), num('ma20')
+            score = int(num('score'))
+            
+            # 构建分析结果文本，各行收集到列表中最后一次拼接，空字符串表示空行
             market_type = analysis.get('type', '')
             if market_type == 'FUND':
-                analysis_text = "【混合型基金分析报告】\n\n"
+                title = "【混合型基金分析报告】"
             elif market_type in ['ETF', 'LOF']:
-                analysis_text = f"【{market_type}基金分析报告】\n\n"
+                title = f"【{market_type}基金分析报告】"
             else:
                 market_name = {
                     'A': 'A股',
                     'HK': '港股',
                     'US': '美股'
                 }.get(market_type, '')
-                analysis_text = f"【{market_name}分析报告】\n\n"
+                title = f"【{market_name}分析报告】"
+            parts = [title, ""]
             
             # 基本信息
-            analysis_text += f"代码: {analysis.get('code', '')}\n"
+            parts.append(f"代码: {analysis.get('code', '')}")
             if analysis.get('name'):
-                analysis_text += f"名称: {analysis.get('name')}\n"
-            analysis_text += f"分析日期: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
+                parts.append(f"名称: {analysis.get('name')}")
+            parts.append(f"分析日期: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
             
             # 市场数据
-            currency = analysis.get('currency', 'CNY')
-            currency_symbol = {
-                'CNY': '¥',
-                'HKD': 'HK$',
-                'USD': '$'
-            }.get(currency, '')
-            
-            latest_price = float(analysis.get('latest_price', 0))
-            latest_change = float(analysis.get('latest_change', 0))
-            latest_turnover = float(analysis.get('latest_turnover', 0))
+            currency_symbol = _CURRENCY_SYMBOL.get(analysis.get('currency', 'CNY'), '')
             
             if market_type in ['ETF', 'LOF']:
-                analysis_text += f"最新净值: {currency_symbol}{latest_price:.4f}\n"
+                parts.append(f"最新净值: {currency_symbol}{latest_price:.4f}")
             else:
-                analysis_text += f"最新价格: {currency_symbol}{latest_price:.2f}\n"
+                parts.append(f"最新价格: {currency_symbol}{latest_price:.2f}")
             
-            analysis_text += f"涨跌幅: {latest_change:.2f}%\n"
+            parts.append(f"涨跌幅: {latest_change:.2f}%")
             if 'latest_turnover' in analysis:
-                analysis_text += f"换手率: {latest_turnover:.2f}%\n"
-            analysis_text += "\n"
+                parts.append(f"换手率: {latest_turnover:.2f}%")
+            parts.append("")
             
             # 技术指标概要
-            analysis_text += "【技术指标概要】\n"
-            analysis_text += f"趋势: {analysis.get('trend', '未知')}\n"
-            
-            # 确保波动率是数值类型
-            volatility = float(analysis.get('volatility', 0))
-            analysis_text += f"波动率: {volatility:.2f}%\n"
-            
-            analysis_text += f"成交量趋势: {analysis.get('volume_trend', '未知')}\n"
-            
-            # 确保RSI是数值类型
-            rsi = float(analysis.get('rsi', 0))
-            analysis_text += f"RSI指标: {rsi:.2f}\n"
-            analysis_text += f"RSI信号: {analysis.get('rsi_signal', '未知')}\n"
-            analysis_text += f"MACD信号: {analysis.get('macd_signal', '未知')}\n\n"
+            parts += [
+                "【技术指标概要】",
+                f"趋势: {analysis.get('trend', '未知')}",
+                f"波动率: {volatility:.2f}%",
+                f"成交量趋势: {analysis.get('volume_trend', '未知')}",
+                f"RSI指标: {rsi:.2f}",
+                f"RSI信号: {analysis.get('rsi_signal', '未知')}",
+                f"MACD信号: {analysis.get('macd_signal', '未知')}",
+                "",
+            ]
             
             # 均线分析
-            analysis_text += "【均线分析】\n"
-            # 确保均线值是数值类型
-            ma5 = float(analysis.get('ma5', 0))
-            ma10 = float(analysis.get('ma10', 0))
-            ma20 = float(analysis.get('ma20', 0))
-            
-            analysis_text += f"5日均线: {ma5:.2f}\n"
-            analysis_text += f"10日均线: {ma10:.2f}\n"
-            analysis_text += f"20日均线: {ma20:.2f}\n\n"
-            
-            # 投资建议
-            analysis_text += "【投资建议】\n"
-            score = int(analysis.get('score', 0))
-            analysis_text += f"综合评分: {score}/100\n"
+            parts += [
+                "【均线分析】",
+                f"5日均线: {ma5:.2f}",
+                f"10日均线: {ma10:.2f}",
+                f"20日均线: {ma20:.2f}",
+                "",
+            ]
             
             # 根据得分给出建议
-            if score >= 80:
-                recommendation = "强烈推荐买入"
-            elif score >= 60:
-                recommendation = "建议买入"
-            elif score >= 40:
-                recommendation = "建议观望"
-            elif score >= 20:
-                recommendation = "建议减持"
-            else:
-                recommendation = "建议卖出"
+            recommendation = next((advice for floor, advice in _SCORE_ADVICE if score >= floor), _SCORE_ADVICE[-1][1])
             
-            analysis_text += f"建议: {recommendation}\n\n"
+            # 投资建议
+            parts += [
+                "【投资建议】",
+                f"综合评分: {score}/100",
+                f"建议: {recommendation}",
+                "",
+            ]
             
             # 风险提示
-            analysis_text += "【风险提示】\n"
-            analysis_text += "以上分析仅供参考，投资有风险，入市需谨慎。"
+            parts += [
+                "【风险提示】",
+                "以上分析仅供参考，投资有风险，入市需谨慎。",
+            ]
             
-            return analysis_text
+            return "\n".join(parts)
             
         except Exception as e:
             self.logger.exception(f"格式化分析结果时出错: {e}")
@@ -934,18 +1371,12 @@ MA20趋势：{', '.join([f'{x:.2f}' for x in data['indicators']['MA20'][-20:]])}
             index_codes = ["000001", "399001", "399006"]  # 上证指数、深证成指、创业板指
             market_summary = "【今日市场总结】\n\n"
             
-            for code in index_codes:
-                try:
-                    analysis = await self._analyze_stock(None, None, code)
-                    if analysis:
-                        # 修改这行，避免在f-string中使用反斜杠
-                        lines = analysis.split('\n')
-                        if len(lines) > 1:
-                            info = lines[1].split(': ')
-                            if len(info) > 1:
-                                market_summary += f"{code}: {info[1]}\n"
-                except Exception as e:
-                    logger.exception(f"获取指数 {code} 数据失败: {e}")
+            # 一次请求取回所有重要指数的行情快照；接口不可用时说明今日总结暂不可用
+            try:
+                market_summary += await self._summarize_index_spot(index_codes)
+            except Exception as e:
+                logger.warning(f"获取指数行情快照失败: {e}")
+                market_summary += "指数行情暂时无法获取，今日市场总结不可用。\n"
             
             # 这里可以配置需要发送的群组或个人
             target_groups = ["12345678@chatroom"]  # 示例群聊ID
@@ -956,20 +1387,37 @@ MA20趋势：{', '.join([f'{x:.2f}' for x in data['indicators']['MA20'][-20:]])}
         except Exception as e:
             logger.exception(f"发送每日市场总结失败: {e}")
 
+    async def _summarize_index_spot(self, index_codes) -> str:
+        """用沪深重要指数的行情快照生成总结，每个指数一行：代码 名称: 最新价 涨跌幅"""
+        spot = await self._ak_call(self.ak.stock_zh_index_spot_em, symbol="沪深重要指数")
+        if spot.empty:
+            raise ValueError("指数行情快照为空")
+        rows = dict(zip(spot['代码'].astype(str).values, range(len(spot))))
+        names, prices, changes = (spot[col].values for col in ('名称', '最新价', '涨跌幅'))
+        summary = ""
+        for code in index_codes:
+            row_pos = rows.get(code)
+            if row_pos is None:
+                logger.warning(f"指数行情快照中没有 {code}")
+                continue
+            summary += f"{code} {names[row_pos]}: {prices[row_pos]}  {changes[row_pos]}%\n"
+        return summary
+
     async def _get_fund_data(self, fund_code: str, fund_type: str = "FUND"):
         """获取基金数据"""
         try:
             self.logger.info(f"正在获取{fund_type}基金数据: {fund_code}")
             
             # 获取历史数据
-            end_date = datetime.now().strftime("%Y%m%d")
-            start_date = (datetime.now() - timedelta(days=180)).strftime("%Y%m%d")
+            now = datetime.now()
+            end_date = now.strftime("%Y%m%d")
+            start_date = (now - timedelta(days=180)).strftime("%Y%m%d")
             
             try:
                 if fund_type == "FUND":
                     self.logger.info(f"获取普通基金数据... 时间范围: {start_date} 至 {end_date}")
                     # 获取基金净值数据
-                    df = self.ak.fund_open_fund_info_em(fund=fund_code, indicator="单位净值走势")
+                    df = await self._ak_call(self.ak.fund_open_fund_info_em, fund=fund_code, indicator="单位净值走势")
                     
                     # 重命名列
                     column_map = {
@@ -979,13 +1427,8 @@ MA20趋势：{', '.join([f'{x:.2f}' for x in data['indicators']['MA20'][-20:]])}
                     }
                     df = df.rename(columns=column_map)
                     
-                    # 获取基金信息
-                    fund_info = self.ak.fund_em_fund_name()
-                    fund_name = ""
-                    if not fund_info.empty:
-                        fund_match = fund_info[fund_info['基金代码'] == fund_code]
-                        if not fund_match.empty:
-                            fund_name = fund_match.iloc[0]['基金简称']
+                    # 获取基金名称
+                    fund_name = await self._get_name('FUND', fund_code)
                     
                     # 添加基金信息到DataFrame的属性中
                     df.attrs['fund_name'] = fund_name
@@ -997,7 +1440,8 @@ MA20趋势：{', '.join([f'{x:.2f}' for x in data['indicators']['MA20'][-20:]])}
                     
                 elif fund_type == "ETF":
                     self.logger.info(f"获取ETF基金数据... 时间范围: {start_date} 至 {end_date}")
-                    df = self.ak.fund_etf_hist_em(
+                    df = await self._ak_call(
+                        self.ak.fund_etf_hist_em,
                         symbol=fund_code,
                         period="daily",
                         start_date=start_date,
@@ -1006,7 +1450,8 @@ MA20趋势：{', '.join([f'{x:.2f}' for x in data['indicators']['MA20'][-20:]])}
                     )
                 else:  # LOF
                     self.logger.info(f"获取LOF基金数据... 时间范围: {start_date} 至 {end_date}")
-                    df = self.ak.fund_lof_hist_em(
+                    df = await self._ak_call(
+                        self.ak.fund_lof_hist_em,
                         symbol=fund_code,
                         period="daily",
                         start_date=start_date,
@@ -1039,17 +1484,8 @@ MA20趋势：{', '.join([f'{x:.2f}' for x in data['indicators']['MA20'][-20:]])}
                 # 重命名列
                 df = df.rename(columns=column_map)
                 
-                # 获取基金名称和类型
-                if fund_type == "ETF":
-                    fund_info = self.ak.fund_etf_spot_em()
-                else:
-                    fund_info = self.ak.fund_lof_spot_em()
-                    
-                fund_name = ""
-                if not fund_info.empty:
-                    fund_match = fund_info[fund_info['代码'] == fund_code]
-                    if not fund_match.empty:
-                        fund_name = fund_match.iloc[0]['名称']
+                # 获取基金名称
+                fund_name = await self._get_name('ETF' if fund_type == "ETF" else 'LOF', fund_code)
                 
                 # 添加基金信息到DataFrame的属性中
                 df.attrs['fund_name'] = fund_name
@@ -1077,12 +1513,14 @@ MA20趋势：{', '.join([f'{x:.2f}' for x in data['indicators']['MA20'][-20:]])}
             stock_code = stock_code.zfill(5)
             
             # 获取历史数据
-            end_date = datetime.now().strftime("%Y%m%d")
-            start_date = (datetime.now() - timedelta(days=180)).strftime("%Y%m%d")
+            now = datetime.now()
+            end_date = now.strftime("%Y%m%d")
+            start_date = (now - timedelta(days=180)).strftime("%Y%m%d")
             
             try:
                 self.logger.info(f"获取港股数据... 时间范围: {start_date} 至 {end_date}")
-                df = self.ak.stock_hk_hist(
+                df = await self._ak_call(
+                    self.ak.stock_hk_hist,
                     symbol=stock_code,
                     period="daily",
                     start_date=start_date,
@@ -1095,12 +1533,7 @@ MA20趋势：{', '.join([f'{x:.2f}' for x in data['indicators']['MA20'][-20:]])}
                     return None
                     
                 # 获取港股名称
-                stock_info = self.ak.stock_hk_spot_em()
-                stock_name = ""
-                if not stock_info.empty:
-                    stock_match = stock_info[stock_info['代码'] == stock_code]
-                    if not stock_match.empty:
-                        stock_name = stock_match.iloc[0]['名称']
+                stock_name = await self._get_name('HK', stock_code)
                 
                 # 重命名列
                 column_map = {
@@ -1141,8 +1574,9 @@ MA20趋势：{', '.join([f'{x:.2f}' for x in data['indicators']['MA20'][-20:]])}
             self.logger.info(f"正在获取美股数据: {stock_code}")
             
             try:
-                # 获取历史数据
-                df = self.ak.stock_us_daily(
+                # 获取历史数据（该接口不支持按日期范围查询，返回全部历史）
+                df = await self._ak_call(
+                    self.ak.stock_us_daily,
                     symbol=stock_code,
                     adjust="qfq"
                 )
@@ -1151,16 +1585,11 @@ MA20趋势：{', '.join([f'{x:.2f}' for x in data['indicators']['MA20'][-20:]])}
                     self.logger.error(f"无法获取美股数据: {stock_code}")
                     return None
                     
-                # 只保留最近180天的数据
-                df = df.tail(180)
+                # 只保留最近180天的数据，复制出来以便尽早释放完整历史
+                df = df.iloc[-180:].copy()
                 
-                # 获取美股名称和实时数据
-                stock_info = self.ak.stock_us_spot_em()
-                stock_name = ""
-                if not stock_info.empty:
-                    stock_match = stock_info[stock_info['代码'] == stock_code]
-                    if not stock_match.empty:
-                        stock_name = stock_match.iloc[0]['名称']
+                # 获取美股名称
+                stock_name = await self._get_name('US', stock_code)
                 
                 # 重命名列
                 column_map = {
@@ -1,18 +1,89 @@
 import os
 import re
+import sys
 import json
+import random
 import aiohttp  # 替换requests为aiohttp
 import asyncio
 import traceback
+from collections import OrderedDict
+from dataclasses import dataclass
 import tomllib  # 新增tomllib库，用于解析TOML文件
-from typing import Dict, List, Tuple, Optional, Union, Any
+from typing import List, Tuple, Optional, Union, Any
 from urllib.parse import quote
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer, Tag
+import soupsieve as sv
 from loguru import logger
 from utils.plugin_base import PluginBase
 from utils.decorators import on_text_message
 from WechatAPI import WechatAPIClient
 
+# 安装了 lxml 时使用其C实现的解析器，未安装时退回内置的 html.parser
+try:
+    import lxml  # noqa: F401
+    _HTML_PARSER = 'lxml'
+except ImportError:
+    _HTML_PARSER = 'html.parser'
+
+# 搜索页只构建结果项子树，页头、导航、页脚不进入文档树
+# class 用正则匹配，元素带有多个 class 时也能命中
+_SEARCH_ITEM_STRAINER = SoupStrainer(class_=re.compile(r'(?:^|\s)module-search-item(?:\s|$)'))
+
+# 剧情简介的标题文字，以及剧情内容元素的选择器：
+# 直接子元素中有"剧情："标题的容器，其下的 .video-info-item（:-soup-contains 需要 soupsieve 2.1+）
+_PLOT_MARKER = "剧情："
+_PLOT_SELECTOR = sv.compile(f':has(> .video-info-itemtitle:-soup-contains("{_PLOT_MARKER}")) .video-info-item')
+
+# 结果项内其余字段的选择器，模块加载时编译一次，每个结果项直接复用
+_ITEM_SELECTOR = sv.compile('.module-search-item')
+_TITLE_SELECTOR = sv.compile('h3 a')
+_PLAY_SELECTOR = sv.compile('.module-item-pic a')
+_IMG_SELECTOR = sv.compile('.module-item-pic img')
+_INFO_ITEMS_SELECTOR = sv.compile('.video-info-items')
+_INFO_ITEM_SELECTOR = sv.compile('.video-info-item')
+_ACTOR_SELECTOR = sv.compile('.video-info-actor a')
+_TAG_LINK_SELECTOR = sv.compile('.tag-link a[href]')
+
+# 结果中缺失字段的占位文字，驻留后所有结果共用同一个字符串对象
+_UNKNOWN_TITLE = sys.intern("未知标题")
+_NO_PLOT = sys.intern("无剧情简介")
+_UNKNOWN_ACTORS = (sys.intern("未知"),)
+_UNKNOWN_YEAR = sys.intern("未知年份")
+_UNKNOWN_AREA = sys.intern("未知地区")
+
+# 清理剧情文本用的正则：开头的空白（含全角空格）、连续空白
+_LEAD_WS_RE = re.compile(r'^[\s　]+')
+_MULTI_WS_RE = re.compile(r'\s+')
+
+# 搜索预览中单条结果的模板，按是否启用emoji在初始化时选定一个
+_PREVIEW_ITEM_EMOJI = "【{index}】{title}\n   👨‍👩‍👧‍👦 主演: {actors}\n   📆 {year} | 🌍 {area}\n\n"
+_PREVIEW_ITEM_PLAIN = "【{index}】{title}\n   主演: {actors}\n   {year} | {area}\n\n"
+
+
+@dataclass(slots=True)
+class VideoResult:
+    """一条搜索结果
+
+    Args:
+        title (str): 标题
+        full_play_url (str, optional): 完整播放链接
+        play_url (str, optional): 播放路径
+        img_url (str, optional): 封面图片
+        plot (str): 剧情简介
+        actors (tuple[str, ...]): 主演
+        year (str): 年份
+        area (str): 地区
+    """
+    title: str
+    full_play_url: Optional[str]
+    play_url: Optional[str]
+    img_url: Optional[str]
+    plot: str
+    actors: Tuple[str, ...]
+    year: str
+    area: str
+
+
 class TVSSpider(PluginBase):
     description = "TVS1网站视频搜索插件"
     author = "BEelzebub"
@@ -24,9 +95,15 @@ class TVSSpider(PluginBase):
         config_path = os.path.join(self.plugin_dir, "config.toml")
         
         # 搜索结果缓存，格式为 {用户ID: {'results': [...], 'keyword': '...', 'timestamp': ...}}
-        self.search_cache = {}
+        # 按写入时间排序，最早写入的条目总在最前面，清理时无需遍历全部用户
+        self.search_cache = OrderedDict()
         # 缓存过期时间（秒）
         self.cache_expire_time = 300  # 5分钟
+        # 按关键词缓存的搜索结果，所有用户共用，格式为 {规范化关键词: (时间戳, 结果列表)}，按最近使用排序
+        self.keyword_cache = OrderedDict()
+        self.keyword_cache_size = 256
+        # 正在进行中的搜索，格式为 {规范化关键词: 任务}，相同关键词的并发请求共用同一个任务
+        self._in_flight = {}
         
         try:
             # 尝试使用tomllib加载配置文件
@@ -79,6 +156,9 @@ class TVSSpider(PluginBase):
             self.timeout = 10
             self.retry_times = 2
             
+        # 预览模板在配置加载后选定一次，格式化时不再逐条判断
+        self._preview_item_template = _PREVIEW_ITEM_EMOJI if self.enable_emoji else _PREVIEW_ITEM_PLAIN
+            
         # 初始化请求头信息
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
@@ -86,10 +166,23 @@ class TVSSpider(PluginBase):
             'Accept-Language': 'zh-CN,zh;q=0.9',
             'Connection': 'keep-alive',
         }
+        # HTTP会话在异步初始化时于运行中的事件循环上创建，所有请求共用
+        self._session = None
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """获取共用的HTTP会话：请求都发往同一站点，复用长连接并缓存DNS"""
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                headers=self.headers,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                connector=aiohttp.TCPConnector(limit=10, ttl_dns_cache=300, keepalive_timeout=60)
+            )
+        return self._session
 
     async def async_init(self):
         """异步初始化插件"""
         try:
+            await self._get_session()
             # 检查网站是否可访问
             if await self.check_site_accessibility():
                 logger.info(f"[TVSSpider] 插件初始化完成，TVS1网站可访问")
@@ -99,26 +192,44 @@ class TVSSpider(PluginBase):
             logger.error(f"[TVSSpider] 插件异步初始化失败: {str(e)}")
             self.enable = False
 
+    async def close(self):
+        """插件关闭时释放HTTP会话"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        logger.info("[TVSSpider] 插件已关闭")
+
+    async def on_disable(self):
+        """插件禁用或重载时关闭HTTP会话"""
+        await self.close()
+        await super().on_disable()
+
+    @staticmethod
+    def _retry_delay(retry_count: int) -> float:
+        """第retry_count次失败后的等待秒数：指数退避加随机抖动，最长8秒，避免多个请求同时重试"""
+        return min(0.5 * (2 ** retry_count) + random.random() * 0.25, 8.0)
+
     async def check_site_accessibility(self) -> bool:
         """检查网站是否可访问"""
         retry_count = 0
         while retry_count < self.retry_times:
             try:
                 logger.info(f"[TVSSpider] 正在检查站点可访问性: {self.base_url}")
-                async with aiohttp.ClientSession() as session:
-                    async with session.get(self.base_url, headers=self.headers, timeout=self.timeout) as response:
-                        if response.status == 200:
-                            logger.info(f"[TVSSpider] 站点可访问: {self.base_url}")
-                            return True
-                        else:
-                            logger.warning(f"[TVSSpider] 站点返回非200状态码: {response.status}")
+                session = await self._get_session()
+                async with session.get(self.base_url) as response:
+                    if response.status == 200:
+                        logger.info(f"[TVSSpider] 站点可访问: {self.base_url}")
+                        return True
+                    else:
+                        logger.warning(f"[TVSSpider] 站点返回非200状态码: {response.status}")
             except Exception as e:
                 logger.error(f"[TVSSpider] 网站访问检查失败: {str(e)}")
             
             retry_count += 1
             if retry_count < self.retry_times:
-                logger.info(f"[TVSSpider] 将在2秒后进行第{retry_count+1}次重试...")
-                await asyncio.sleep(2)
+                delay = self._retry_delay(retry_count)
+                logger.info(f"[TVSSpider] 将在{delay:.1f}秒后进行第{retry_count+1}次重试...")
+                await asyncio.sleep(delay)
                 
         logger.error(f"[TVSSpider] 站点不可访问: {self.base_url}，已重试{self.retry_times}次")
         return False
@@ -197,7 +308,7 @@ class TVSSpider(PluginBase):
                 
             # 获取选定的结果
             selected_result = results[index-1]
-            logger.info(f"[TVSSpider] 选择了结果: #{index}, 标题: {selected_result.get('标题', '未知')}")
+            logger.info(f"[TVSSpider] 选择了结果: #{index}, 标题: {selected_result.title}")
             
             # 组装详情回复
             detail_response = await self.format_detail_result(index, selected_result)
@@ -229,6 +340,7 @@ class TVSSpider(PluginBase):
                     'keyword': keyword,
                     'timestamp': asyncio.get_event_loop().time()
                 }
+                self.search_cache.move_to_end(cache_key)
                 logger.info(f"[TVSSpider] 已缓存搜索结果，用户: {cache_key}, 结果数: {len(results)}")
                 
                 # 组装第一步回复内容（只包含编号、标题、演员、年份）
@@ -247,20 +359,56 @@ class TVSSpider(PluginBase):
     def _clean_expired_cache(self):
         """清理过期的缓存"""
         current_time = asyncio.get_event_loop().time()
-        expired_keys = []
+        expired_count = 0
         
-        for key, cache_data in self.search_cache.items():
-            if current_time - cache_data['timestamp'] > self.cache_expire_time:
-                expired_keys.append(key)
-                
-        for key in expired_keys:
-            del self.search_cache[key]
+        # 条目按写入时间排序，从最早的开始弹出，遇到未过期的即可停止
+        while self.search_cache:
+            cache_data = next(iter(self.search_cache.values()))
+            if current_time - cache_data['timestamp'] <= self.cache_expire_time:
+                break
+            self.search_cache.popitem(last=False)
+            expired_count += 1
             
-        if expired_keys:
-            logger.info(f"[TVSSpider] 已清理 {len(expired_keys)} 条过期缓存")
+        if expired_count:
+            logger.info(f"[TVSSpider] 已清理 {expired_count} 条过期缓存")
 
-    async def search_video(self, keyword: str) -> List[Dict]:
-        """搜索视频资源"""
+    async def search_video(self, keyword: str) -> List[VideoResult]:
+        """搜索视频资源，同一关键词在缓存有效期内直接返回缓存结果"""
+        cache_key = keyword.strip().lower()
+        now = asyncio.get_event_loop().time()
+        cached = self.keyword_cache.get(cache_key)
+        if cached is not None:
+            if now - cached[0] <= self.cache_expire_time:
+                self.keyword_cache.move_to_end(cache_key)
+                logger.info(f"[TVSSpider] 命中关键词缓存: {keyword}")
+                # 结果只读，直接共用同一份列表
+                return cached[1]
+            del self.keyword_cache[cache_key]
+        
+        # 相同关键词已有请求在进行中时，等待它的结果，不再重复请求站点
+        task = self._in_flight.get(cache_key)
+        if task is None:
+            task = asyncio.create_task(self._fetch_and_cache(cache_key, keyword, now))
+            self._in_flight[cache_key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(cache_key, None))
+        else:
+            logger.info(f"[TVSSpider] 等待进行中的相同搜索: {keyword}")
+        # shield：某个调用方被取消时不影响其他等待同一任务的调用方
+        return await asyncio.shield(task)
+
+    async def _fetch_and_cache(self, cache_key: str, keyword: str, now: float) -> List[VideoResult]:
+        """请求并解析搜索结果，写入关键词缓存"""
+        results = await self._fetch_and_parse(keyword)
+        # 只缓存非空结果，避免站点偶发异常时把空结果保留5分钟
+        if results:
+            self.keyword_cache[cache_key] = (now, results)
+            self.keyword_cache.move_to_end(cache_key)
+            while len(self.keyword_cache) > self.keyword_cache_size:
+                self.keyword_cache.popitem(last=False)
+        return results
+
+    async def _fetch_and_parse(self, keyword: str) -> List[VideoResult]:
+        """请求搜索页并解析出结果列表"""
         # URL编码搜索关键词
         encoded_keyword = quote(keyword)
         search_url = f"{self.base_url}/index.php/vod/search.html?wd={encoded_keyword}"
@@ -270,127 +418,30 @@ class TVSSpider(PluginBase):
             try:
                 # 执行搜索请求
                 logger.info(f"[TVSSpider] 正在搜索关键词: {keyword}, URL: {search_url}")
-                async with aiohttp.ClientSession() as session:
-                    async with session.get(search_url, headers=self.headers, timeout=self.timeout) as response:
-                        if response.status != 200:
-                            logger.error(f"[TVSSpider] 搜索请求失败，状态码: {response.status}")
-                            retry_count += 1
-                            if retry_count < self.retry_times:
-                                logger.info(f"[TVSSpider] 将在2秒后进行第{retry_count+1}次重试...")
-                                await asyncio.sleep(2)
-                                continue
-                            else:
-                                raise Exception(f"搜索请求失败，HTTP状态码: {response.status}")
-                        
-                        html = await response.text()
-                
-                # 解析HTML
-                soup = BeautifulSoup(html, 'html.parser')
-                
-                # 查找所有搜索结果项
-                search_items = soup.select('.module-search-item')
-                
-                if not search_items:
-                    logger.info(f"[TVSSpider] 未找到结果: {keyword}")
-                    return []
-                
-                logger.info(f"[TVSSpider] 找到 {len(search_items)} 条结果: {keyword}")
-                
-                results = []
-                for item in search_items:
-                    # 提取标题
-                    title_element = item.select_one('h3 a')
-                    title = title_element.get('title') if title_element else "未知标题"
-                    
-                    # 提取播放链接
-                    play_element = item.select_one('.module-item-pic a')
-                    play_url = play_element.get('href') if play_element else None
-                    full_play_url = self.base_url + play_url if play_url else None
-                    
-                    # 提取封面图片
-                    img_element = item.select_one('.module-item-pic img')
-                    img_url = img_element.get('data-src') if img_element else None
-                    
-                    # 提取剧情简介 - 精确定位"剧情："后面的内容
-                    plot = "无剧情简介"
-                    try:
-                        # 查找包含"剧情："的元素
-                        plot_title_elements = item.select('.video-info-itemtitle')
-                        plot_title_element = None
-                        for title_elem in plot_title_elements:
-                            if "剧情：" in title_elem.text:
-                                plot_title_element = title_elem
-                                break
-                        
-                        if plot_title_element:
-                            # 找到剧情标题所在的父容器
-                            plot_container = plot_title_element.parent
-                            
-                            # 从父容器中查找剧情内容
-                            plot_element = plot_container.select_one('.video-info-item')
-                            
-                            if plot_element:
-                                # 获取文本并清理
-                                plot = plot_element.text.strip()
-                                logger.info(f"[TVSSpider] 通过剧情标题找到剧情: {plot[:30]}..." if len(plot) > 30 else f"[TVSSpider] 通过剧情标题找到剧情: {plot}")
+                session = await self._get_session()
+                async with session.get(search_url) as response:
+                    if response.status != 200:
+                        logger.error(f"[TVSSpider] 搜索请求失败，状态码: {response.status}")
+                        retry_count += 1
+                        if retry_count < self.retry_times:
+                            delay = self._retry_delay(retry_count)
+                            logger.info(f"[TVSSpider] 将在{delay:.1f}秒后进行第{retry_count+1}次重试...")
+                            await asyncio.sleep(delay)
+                            continue
                         else:
-                            # 直接查找所有video-info-items元素
-                            info_items = item.select('.video-info-items')
-                            
-                            for info_item in info_items:
-                                # 检查是否包含"剧情："文本
-                                if "剧情：" in info_item.text:
-                                    # 尝试找到剧情内容元素
-                                    plot_element = info_item.select_one('.video-info-item')
-                                    if plot_element:
-                                        plot = plot_element.text.strip()
-                                        logger.info(f"[TVSSpider] 通过文本匹配找到剧情: {plot[:30]}..." if len(plot) > 30 else f"[TVSSpider] 通过文本匹配找到剧情: {plot}")
-                                    else:
-                                        # 如果没有找到专门的元素，则提取整个文本并去除"剧情："前缀
-                                        full_text = info_item.text.strip()
-                                        if "剧情：" in full_text:
-                                            plot = full_text.split("剧情：", 1)[1].strip()
-                                            logger.info(f"[TVSSpider] 通过分割文本找到剧情: {plot[:30]}..." if len(plot) > 30 else f"[TVSSpider] 通过分割文本找到剧情: {plot}")
-                        
-                        # 清理剧情文本
-                        if plot and plot != "无剧情简介":
-                            # 去除开头的全角空格(　)和其他空白字符
-                            plot = re.sub(r'^[\s　]+', '', plot)
-                            # 替换多个空格为单个空格
-                            plot = re.sub(r'\s+', ' ', plot)
-                            # 如果简介超过一定长度，截断并添加省略号
-                            if len(plot) > 200:
-                                plot = plot[:197] + "..."
-                    except Exception as e:
-                        logger.error(f"[TVSSpider] 提取剧情简介时出错: {str(e)}")
-                        plot = "无剧情简介"
-                    
-                    logger.info(f"[TVSSpider] 最终提取到的剧情简介: {plot[:50]}..." if len(plot) > 50 else f"[TVSSpider] 最终提取到的剧情简介: {plot}")
-                    
-                    # 提取主演信息
-                    actors_elements = item.select('.video-info-actor a')
-                    actors = [actor.text for actor in actors_elements] if actors_elements else ["未知"]
+                            raise Exception(f"搜索请求失败，HTTP状态码: {response.status}")
                     
-                    # 提取年份和地区
-                    year_element = item.select_one('.tag-link a[href*="year"]')
-                    year = year_element.text.strip() if year_element else "未知年份"
-                    
-                    area_element = item.select_one('.tag-link a[href*="area"]')
-                    area = area_element.text.strip() if area_element else "未知地区"
-                    
-                    # 组织结果
-                    result = {
-                        "标题": title,
-                        "播放链接": full_play_url,
-                        "播放路径": play_url,
-                        "封面图片": img_url,
-                        "剧情简介": plot,
-                        "主演": actors,
-                        "年份": year,
-                        "地区": area
-                    }
-                    results.append(result)
+                    # 直接取原始字节交给解析器解码，不先把整页转成Python字符串
+                    html = await response.read()
+                    charset = response.charset
+                
+                # 解析和逐项提取都是纯CPU工作，放到线程中执行，避免阻塞事件循环
+                results = await asyncio.to_thread(self._parse_results, html, charset)
                 
+                if not results:
+                    logger.info(f"[TVSSpider] 未找到结果: {keyword}")
+                else:
+                    logger.info(f"[TVSSpider] 找到 {len(results)} 条结果: {keyword}")
                 return results
                 
             except Exception as e:
@@ -398,90 +449,171 @@ class TVSSpider(PluginBase):
                 logger.error(traceback.format_exc())
                 retry_count += 1
                 if retry_count < self.retry_times:
-                    logger.info(f"[TVSSpider] 将在2秒后进行第{retry_count+1}次重试...")
-                    await asyncio.sleep(2)
+                    delay = self._retry_delay(retry_count)
+                    logger.info(f"[TVSSpider] 将在{delay:.1f}秒后进行第{retry_count+1}次重试...")
+                    await asyncio.sleep(delay)
                 else:
                     raise Exception(f"搜索失败，已重试{self.retry_times}次: {str(e)}")
 
-    async def format_search_preview(self, keyword: str, results: List[Dict]) -> str:
+    def _parse_results(self, html: bytes, charset: Optional[str]) -> List[VideoResult]:
+        """解析搜索页，返回全部结果"""
+        soup = BeautifulSoup(html, _HTML_PARSER, parse_only=_SEARCH_ITEM_STRAINER, from_encoding=charset)
+        return [self._extract_item(item) for item in _ITEM_SELECTOR.select(soup)]
+
+    def _extract_item(self, item) -> VideoResult:
+        """从一个搜索结果项中提取各字段"""
+        # 提取标题
+        title_element = _TITLE_SELECTOR.select_one(item)
+        title = title_element.get('title') if title_element else _UNKNOWN_TITLE
+        
+        # 提取播放链接
+        play_element = _PLAY_SELECTOR.select_one(item)
+        play_url = play_element.get('href') if play_element else None
+        full_play_url = self.base_url + play_url if play_url else None
+        
+        # 提取封面图片
+        img_element = _IMG_SELECTOR.select_one(item)
+        img_url = img_element.get('data-src') if img_element else None
+        
+        # 提取剧情简介 - 精确定位"剧情："后面的内容
+        plot = _NO_PLOT
+        try:
+            # 一次查询完成：定位"剧情："标题、回到其父容器、取出剧情内容元素
+            plot_element = _PLOT_SELECTOR.select_one(item)
+            
+            if plot_element:
+                # 获取文本并清理
+                plot = plot_element.text.strip()
+                logger.info("[TVSSpider] 通过剧情标题找到剧情: {:.30}{}", plot, "..." if len(plot) > 30 else "")
+            else:
+                # 直接查找所有video-info-items元素
+                info_items = _INFO_ITEMS_SELECTOR.select(item)
+                
+                for info_item in info_items:
+                    # 检查是否包含"剧情："文本，一次扫描同时得到其后的内容
+                    _, marker, after_marker = info_item.text.partition(_PLOT_MARKER)
+                    if marker:
+                        # 尝试找到剧情内容元素
+                        plot_element = _INFO_ITEM_SELECTOR.select_one(info_item)
+                        if plot_element:
+                            plot = plot_element.text.strip()
+                            logger.info("[TVSSpider] 通过文本匹配找到剧情: {:.30}{}", plot, "..." if len(plot) > 30 else "")
+                        else:
+                            # 如果没有找到专门的元素，则取"剧情："之后的文本
+                            plot = after_marker.strip()
+                            logger.info("[TVSSpider] 通过分割文本找到剧情: {:.30}{}", plot, "..." if len(plot) > 30 else "")
+            
+            # 清理剧情文本
+            if plot and plot != _NO_PLOT:
+                # 去除开头的全角空格(　)和其他空白字符
+                plot = _LEAD_WS_RE.sub('', plot)
+                # 替换多个空格为单个空格
+                plot = _MULTI_WS_RE.sub(' ', plot)
+                # 如果简介超过一定长度，截断并添加省略号
+                if len(plot) > 200:
+                    plot = plot[:197] + "..."
+        except Exception as e:
+            logger.error(f"[TVSSpider] 提取剧情简介时出错: {str(e)}")
+            plot = _NO_PLOT
+        
+        logger.info("[TVSSpider] 最终提取到的剧情简介: {:.50}{}", plot, "..." if len(plot) > 50 else "")
+        
+        # 提取主演信息
+        actors = tuple(map(Tag.get_text, _ACTOR_SELECTOR.select(item))) or _UNKNOWN_ACTORS
+        
+        # 提取年份和地区：一次取出标签链接，按链接地址区分，各取第一个
+        year = area = None
+        for link in _TAG_LINK_SELECTOR.select(item):
+            href = link['href']
+            if year is None and 'year' in href:
+                year = link.text.strip()
+            if area is None and 'area' in href:
+                area = link.text.strip()
+        year = year if year is not None else _UNKNOWN_YEAR
+        area = area if area is not None else _UNKNOWN_AREA
+        
+        # 组织结果
+        return VideoResult(
+            title=title,
+            full_play_url=full_play_url,
+            play_url=play_url,
+            img_url=img_url,
+            plot=plot,
+            actors=actors,
+            year=year,
+            area=area
+        )
+
+    @staticmethod
+    def _format_actors(actors: Tuple[str, ...]) -> str:
+        """拼接主演，最多显示3个演员，超出时加“等”"""
+        text = "、".join(actors[:3])
+        return text + "等" if len(actors) > 3 else text
+
+    async def format_search_preview(self, keyword: str, results: List[VideoResult]) -> str:
         """格式化搜索结果为简要回复消息（第一步）"""
-        # 组装输出信息
+        # 组装输出信息，各段收集到列表中最后一次拼接
         emoji_prefix = "🔍 " if self.enable_emoji else ""
-        output = f"{emoji_prefix}找到 {len(results)} 条与\"{keyword}\"相关的内容\n\n"
+        parts = [f"{emoji_prefix}找到 {len(results)} 条与\"{keyword}\"相关的内容\n\n"]
         
         # 最多显示max_results条结果
         max_results = min(len(results), self.max_results)
+        template = self._preview_item_template
         for i, result in enumerate(results[:max_results], 1):
-            title = result["标题"]
-            actors = "、".join(result["主演"][:3])  # 最多显示3个演员
-            if len(result["主演"]) > 3:
-                actors += "等"
-            
-            # 根据设置添加emoji
-            if self.enable_emoji:
-                output += f"【{i}】{title}\n"
-                output += f"   👨‍👩‍👧‍👦 主演: {actors}\n"
-                output += f"   📆 {result['年份']} | 🌍 {result['地区']}\n\n"
-            else:
-                output += f"【{i}】{title}\n"
-                output += f"   主演: {actors}\n"
-                output += f"   {result['年份']} | {result['地区']}\n\n"
+            parts.append(template.format(
+                index=i,
+                title=result.title,
+                actors=self._format_actors(result.actors),
+                year=result.year,
+                area=result.area
+            ))
         
         # 如果结果超过最大显示数，添加提示
         if len(results) > self.max_results:
-            output += f"还有 {len(results) - self.max_results} 条结果未显示...\n"
-            output += f"输入更精确的关键词可以获得更准确的结果\n\n"
+            parts.append(f"还有 {len(results) - self.max_results} 条结果未显示...\n")
+            parts.append("输入更精确的关键词可以获得更准确的结果\n\n")
         
         # 添加使用详情命令的提示
         command_tip = f"{self.command}# 编号"
         if self.enable_emoji:
-            output += f"📌 获取链接请发送: {command_tip} (例如: {self.command}# 1)"
+            parts.append(f"📌 获取链接请发送: {command_tip} (例如: {self.command}# 1)")
         else:
-            output += f"获取链接请发送: {command_tip} (例如: {self.command}# 1)"
+            parts.append(f"获取链接请发送: {command_tip} (例如: {self.command}# 1)")
         
-        return output.strip()
+        return "".join(parts).strip()
 
-    async def format_detail_result(self, index: int, result: Dict) -> str:
+    async def format_detail_result(self, index: int, result: VideoResult) -> str:
         """格式化详细结果为回复消息（第二步）"""
-        title = result["标题"]
+        title = result.title
+        
+        # 添加主演信息
+        actors = self._format_actors(result.actors)
+        
+        # 剧情简介（不限制长度）
+        plot = result.plot
+        has_plot = plot and plot != _NO_PLOT
         
         # 根据设置添加emoji前缀
         if self.enable_emoji:
-            output = f"🎬 【{title}】\n\n"
-            output += f"📺 播放链接: https://hadis898.github.io/qqfh/api/?url={result['播放链接']}\n\n"
-            
-            # 添加主演信息
-            actors = "、".join(result["主演"][:3])  # 最多显示3个演员
-            if len(result["主演"]) > 3:
-                actors += "等"
-            output += f"👨‍👩‍👧‍👦 主演: {actors}\n"
-            
-            # 添加年份和地区
-            output += f"📆 年份: {result['年份']} | 🌍 地区: {result['地区']}\n"
-            
-            # 添加剧情简介（不限制长度）
-            plot = result['剧情简介']
-            if plot and plot != "无剧情简介":
-                output += f"\n📝 简介: {plot}\n"
+            parts = [
+                f"🎬 【{title}】\n\n",
+                f"📺 播放链接: https://hadis898.github.io/qqfh/api/?url={result.full_play_url}\n\n",
+                f"👨‍👩‍👧‍👦 主演: {actors}\n",
+                f"📆 年份: {result.year} | 🌍 地区: {result.area}\n",
+            ]
+            if has_plot:
+                parts.append(f"\n📝 简介: {plot}\n")
         else:
-            output = f"【{title}】\n\n"
-            output += f"播放链接: https://hadis898.github.io/qqfh/api/?url={result['播放链接']}\n\n"
-            
-            # 添加主演信息
-            actors = "、".join(result["主演"][:3])
-            if len(result["主演"]) > 3:
-                actors += "等"
-            output += f"主演: {actors}\n"
-            
-            # 添加年份和地区
-            output += f"年份: {result['年份']} | 地区: {result['地区']}\n"
-            
-            # 添加剧情简介（不限制长度）
-            plot = result['剧情简介']
-            if plot and plot != "无剧情简介":
-                output += f"\n简介: {plot}\n"
+            parts = [
+                f"【{title}】\n\n",
+                f"播放链接: https://hadis898.github.io/qqfh/api/?url={result.full_play_url}\n\n",
+                f"主演: {actors}\n",
+                f"年份: {result.year} | 地区: {result.area}\n",
+            ]
+            if has_plot:
+                parts.append(f"\n简介: {plot}\n")
         
-        return output.strip()
+        return "".join(parts).strip()
 
 # 添加插件导出的接口
 __plugin_name__ = "TVSSpider"
@@ -534,16 +666,17 @@ if __name__ == "__main__":
                     
                 print(f"\n正在测试URL: {test_url}")
                 try:
-                    async with aiohttp.ClientSession() as session:
-                        async with session.get(test_url, headers=plugin.headers, timeout=plugin.timeout) as response:
-                            if response.status != 200:
-                                print(f"\n请求失败，状态码: {response.status}")
-                                continue
-                                
-                            html = await response.text()
+                    # 复用插件的HTTP会话，连续测试多个URL时不必重新建立连接
+                    session = await plugin._get_session()
+                    async with session.get(test_url) as response:
+                        if response.status != 200:
+                            print(f"\n请求失败，状态码: {response.status}")
+                            continue
+                            
+                        html = await response.text()
                             
                     # 解析HTML
-                    soup = BeautifulSoup(html, 'html.parser')
+                    soup = BeautifulSoup(html, _HTML_PARSER)
                     
                     # 尝试提取剧情描述
                     print("\n尝试提取剧情描述...")
@@ -573,8 +706,8 @@ if __name__ == "__main__":
                             print(f"找到剧情内容: {plot[:100]}...")
                             
                             # 清理全角空格
-                            cleaned_plot = re.sub(r'^[\s　]+', '', plot)
-                            cleaned_plot = re.sub(r'\s+', ' ', cleaned_plot)
+                            cleaned_plot = _LEAD_WS_RE.sub('', plot)
+                            cleaned_plot = _MULTI_WS_RE.sub(' ', cleaned_plot)
                             print(f"清理后的剧情: {cleaned_plot[:100]}...")
                     else:
                         print("未找到剧情标题元素")
@@ -595,19 +728,20 @@ if __name__ == "__main__":
                                     print(f"找到剧情内容元素: {plot[:100]}...")
                                     
                                     # 清理全角空格
-                                    cleaned_plot = re.sub(r'^[\s　]+', '', plot)
-                                    cleaned_plot = re.sub(r'\s+', ' ', cleaned_plot)
+                                    cleaned_plot = _LEAD_WS_RE.sub('', plot)
+                                    cleaned_plot = _MULTI_WS_RE.sub(' ', cleaned_plot)
                                     print(f"清理后的剧情: {cleaned_plot[:100]}...")
                                 else:
                                     # 如果没有找到专门的元素，则提取整个文本并去除"剧情："前缀
                                     full_text = info_item.text.strip()
-                                    if "剧情：" in full_text:
-                                        plot = full_text.split("剧情：", 1)[1].strip()
+                                    _, marker, after_marker = full_text.partition("剧情：")
+                                    if marker:
+                                        plot = after_marker.strip()
                                         print(f"通过分割文本找到剧情: {plot[:100]}...")
                                         
                                         # 清理全角空格
-                                        cleaned_plot = re.sub(r'^[\s　]+', '', plot)
-                                        cleaned_plot = re.sub(r'\s+', ' ', cleaned_plot)
+                                        cleaned_plot = _LEAD_WS_RE.sub('', plot)
+                                        cleaned_plot = _MULTI_WS_RE.sub(' ', cleaned_plot)
                                         print(f"清理后的剧情: {cleaned_plot[:100]}...")
                     
                     # 展示相关HTML结构
@@ -683,6 +817,8 @@ if __name__ == "__main__":
             
             else:
                 print("\n未识别的命令。使用'TVS 关键词'进行搜索，使用'TVS# 编号'获取详情，或使用'URL 网址'测试剧情提取")
+        
+        await plugin.close()
     
     try:
         asyncio.run(test_search())
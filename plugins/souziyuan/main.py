@@ -1,9 +1,9 @@
 import tomllib
 import urllib.parse
-import requests
+import asyncio
+import aiohttp
 import logging
 from datetime import datetime
-import time
 import os
 
 from WechatAPI import WechatAPIClient
@@ -32,14 +32,40 @@ class ResourceSearch(PluginBase):
             self.api_url = config["api_url"]
             self.timeout = config["timeout"]
             self.search_keywords = config["search_keywords"]
+            # 按长度从长到短排列，保证"搜资源"先于"搜"匹配
+            self._keyword_tuple = tuple(sorted(self.search_keywords, key=len, reverse=True))
             self.max_results = config["max_results"]
             
+            # HTTP会话在异步初始化时于运行中的事件循环上创建，所有搜索共用
+            self._session = None
+            
             logger.info("[ResourceSearch] 插件初始化完成")
             
         except Exception as e:
             logger.error(f"[ResourceSearch] 加载配置文件失败: {e}")
             raise e
 
+    async def async_init(self):
+        """异步初始化插件"""
+        await self._get_session()
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """获取共用的HTTP会话，未创建或已关闭时重新创建"""
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession()
+        return self._session
+
+    async def close(self):
+        """插件关闭时释放HTTP会话"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def on_disable(self):
+        """插件禁用或重载时关闭HTTP会话"""
+        await self.close()
+        await super().on_disable()
+
     def get_help(self) -> str:
         """返回插件帮助信息"""
         help_text = "资源搜索插件使用说明:\n\n"
@@ -109,88 +135,90 @@ class ResourceSearch(PluginBase):
                 )
             return
             
-        # 检查是否包含搜索关键词
-        for keyword in self.search_keywords:
-            if content.startswith(keyword):
-                logger.info(f"[ResourceSearch] 匹配到关键词，content: {content}")
-                self.current_keyword = keyword
+        # 检查是否以搜索关键词开头：先用一次 startswith(元组) 过滤普通消息，命中后再取最长的关键词
+        if not content.startswith(self._keyword_tuple):
+            return
+        keyword = next(k for k in self._keyword_tuple if content.startswith(k))
+        
+        logger.info(f"[ResourceSearch] 匹配到关键词，content: {content}")
+        self.current_keyword = keyword
+        
+        # 提取搜索内容
+        search_text = content[len(keyword):].strip()
+        if not search_text:
+            reply_text = "请输入要搜索的内容\n例如：搜三体"
+            
+            # 在群聊中使用send_at_message
+            if is_group_chat and sender_id:
+                await bot.send_at_message(
+                    chat_id,
+                    "\n" + reply_text,  # 添加换行
+                    [sender_id]  # 使用列表传递要at的用户ID
+                )
+            else:
+                await bot.send_text_message(
+                    chat_id,
+                    reply_text
+                )
+            return
+            
+        try:
+            # 如果是全网搜索，先发送提示
+            if any(keyword.startswith(k) for k in ["全网搜", "搜资源"]):
+                reply_text = "🔍 正在进行全网搜索，请稍等30秒...\n期间请勿重复发送搜索"
                 
-                # 提取搜索内容
-                search_text = content[len(keyword):].strip()
-                if not search_text:
-                    reply_text = "请输入要搜索的内容\n例如：搜三体"
-                    
-                    # 在群聊中使用send_at_message
-                    if is_group_chat and sender_id:
-                        await bot.send_at_message(
-                            chat_id,
-                            "\n" + reply_text,  # 添加换行
-                            [sender_id]  # 使用列表传递要at的用户ID
-                        )
-                    else:
-                        await bot.send_text_message(
-                            chat_id,
-                            reply_text
-                        )
-                    return
-                    
-                try:
-                    # 如果是全网搜索，先发送提示
-                    if any(keyword.startswith(k) for k in ["全网搜", "搜资源"]):
-                        reply_text = "🔍 正在进行全网搜索，请稍等30秒...\n期间请勿重复发送搜索"
-                        
-                        # 无需艾特用户，直接发送消息
-                        await bot.send_text_message(
-                            chat_id,
-                            reply_text
-                        )
-                        time.sleep(1)
-                        result = await self._search_all(search_text)
-                    else:
-                        # 普通搜索
-                        result = await self._search_normal(search_text)
-                        # 如果普通搜索未找到结果，尝试全网搜索
-                        if "未找到" in result:
-                            reply_text = "💡 普通搜索未找到结果，正在尝试全网搜索，请稍等30秒...\n期间请勿重复发送搜索"
-                            
-                            # 无需艾特用户，直接发送消息
-                            await bot.send_text_message(
-                                chat_id,
-                                reply_text
-                            )
-                            time.sleep(1)
-                            result = await self._search_all(search_text)
-                    
-                    # 发送搜索结果，使用send_at_message
-                    if is_group_chat and sender_id:
-                        await bot.send_at_message(
-                            chat_id,
-                            "\n" + result,  # 添加换行
-                            [sender_id]  # 使用列表传递要at的用户ID
-                        )
-                    else:
-                        await bot.send_text_message(
-                            chat_id,
-                            result
-                        )
-                except Exception as e:
-                    logger.error(f"[ResourceSearch] 搜索出错: {e}")
-                    
-                    reply_text = f"搜索过程中出现错误: {str(e)}\n请稍后重试"
+                # 无需艾特用户，直接发送消息
+                await bot.send_text_message(
+                    chat_id,
+                    reply_text
+                )
+                await asyncio.sleep(1)
+                result = await self._search_all(search_text)
+            else:
+                # 普通搜索
+                result = await self._search_normal(search_text)
+                # 如果普通搜索未找到结果，尝试全网搜索
+                if "未找到" in result:
+                    reply_text = "💡 普通搜索未找到结果，正在尝试全网搜索，请稍等30秒...\n期间请勿重复发送搜索"
                     
-                    # 在群聊中使用send_at_message
-                    if is_group_chat and sender_id:
-                        await bot.send_at_message(
-                            chat_id,
-                            "\n" + reply_text,  # 添加换行
-                            [sender_id]  # 使用列表传递要at的用户ID
-                        )
-                    else:
-                        await bot.send_text_message(
-                            chat_id,
-                            reply_text
-                        )
-                return
+                    # 无需艾特用户，直接发送消息
+                    await bot.send_text_message(
+                        chat_id,
+                        reply_text
+                    )
+                    await asyncio.sleep(1)
+                    result = await self._search_all(search_text)
+            
+            # 发送搜索结果，使用send_at_message
+            if is_group_chat and sender_id:
+                await bot.send_at_message(
+                    chat_id,
+                    "\n" + result,  # 添加换行
+                    [sender_id]  # 使用列表传递要at的用户ID
+                )
+            else:
+                await bot.send_text_message(
+                    chat_id,
+                    result
+                )
+        except Exception as e:
+            logger.error(f"[ResourceSearch] 搜索出错: {e}")
+            
+            reply_text = f"搜索过程中出现错误: {str(e)}\n请稍后重试"
+            
+            # 在群聊中使用send_at_message
+            if is_group_chat and sender_id:
+                await bot.send_at_message(
+                    chat_id,
+                    "\n" + reply_text,  # 添加换行
+                    [sender_id]  # 使用列表传递要at的用户ID
+                )
+            else:
+                await bot.send_text_message(
+                    chat_id,
+                    reply_text
+                )
+        return
 
     async def _search_normal(self, keyword):
         """普通搜索接口"""
@@ -208,19 +236,19 @@ class ResourceSearch(PluginBase):
             }
             
             # 发送请求
-            response = requests.get(
+            session = await self._get_session()
+            async with session.get(
                 f"{self.api_url}/api/search?title={encoded_keyword}",
                 headers=headers,
-                timeout=self.timeout
-            )
-            
-            # 检查响应状态
-            if response.status_code != 200:
-                logger.error(f"[ResourceSearch] 搜索失败，状态码：{response.status_code}")
-                return "🔍 搜索暂时失败\n💡 提示：服务器可能繁忙，请稍后再试"
-            
-            # 解析响应数据
-            data = response.json()
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            ) as response:
+                # 检查响应状态
+                if response.status != 200:
+                    logger.error(f"[ResourceSearch] 搜索失败，状态码：{response.status}")
+                    return "🔍 搜索暂时失败\n💡 提示：服务器可能繁忙，请稍后再试"
+                
+                # 解析响应数据（不校验 Content-Type，接口返回的类型不一定是 application/json）
+                data = await response.json(content_type=None)
             if data['code'] != 200:
                 return f"搜索失败：{data['message']}"
             
@@ -269,18 +297,18 @@ class ResourceSearch(PluginBase):
             }
             
             # 发送POST请求
-            response = requests.post(
+            session = await self._get_session()
+            async with session.post(
                 f"{self.api_url}/api/other/all_search",
                 json={"title": keyword},
                 headers=headers,
-                timeout=self.timeout
-            )
-            
-            if response.status_code != 200:
-                logger.error(f"[ResourceSearch] 全网搜索失败，状态码：{response.status_code}")
-                return "🔍 全网搜索暂时失败\n💡 提示：服务器可能繁忙，请稍后再试\n⚡ 建议：可以尝试使用普通搜索"
-            
-            data = response.json()
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            ) as response:
+                if response.status != 200:
+                    logger.error(f"[ResourceSearch] 全网搜索失败，状态码：{response.status}")
+                    return "🔍 全网搜索暂时失败\n💡 提示：服务器可能繁忙，请稍后再试\n⚡ 建议：可以尝试使用普通搜索"
+                
+                data = await response.json(content_type=None)
             if data['code'] != 200:
                 return f"搜索失败：{data['message']}"
             
@@ -314,7 +342,7 @@ class ResourceSearch(PluginBase):
             result_msg += "大额流量卡19/月\nh5.gantanhao.com/url?value=akijF1744729274277\n"
             return result_msg
             
-        except requests.exceptions.ReadTimeout:
+        except asyncio.TimeoutError:
             return "🔍 全网搜索超时\n💡 提示：全网搜索需要更长时间，请稍后重试"
         except Exception as e:
             logger.error(f"[ResourceSearch] 全网搜索失败: {e}")
@@ -17,6 +17,13 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# token 有效期（秒），以及提前多久视为即将过期而重新签发
+TOKEN_TTL = 900
+TOKEN_REFRESH_MARGIN = 60
+
+# 已签发的 token 缓存：(kid, sub) -> (token, 过期时间)
+_TOKEN_CACHE = {}
+
 def load_config():
     """加载配置文件"""
     try:
@@ -30,16 +37,22 @@ def load_config():
         raise
 
 def generate_jwt_token(config):
-    """生成JWT token"""
+    """生成JWT token，有效期内重复调用直接返回已签发的 token"""
     try:
+        now = int(time.time())
+        cache_key = (config['jwt-kid'], config['jwt-sub'])
+        cached = _TOKEN_CACHE.get(cache_key)
+        if cached and now < cached[1] - TOKEN_REFRESH_MARGIN:
+            logger.debug("使用缓存的JWT token")
+            return cached[0]
+        
         logger.info("开始生成JWT token...")
         logger.debug(f"使用的配置: kid={config['jwt-kid']}, sub={config['jwt-sub']}")
         
         # 设置过期时间为15分钟
-        now = int(time.time())
         payload = {
             'iat': now - 30,  # 提前30秒
-            'exp': now + 900,  # 15分钟后过期
+            'exp': now + TOKEN_TTL,  # 15分钟后过期
             'sub': config['jwt-sub']
         }
         
@@ -59,6 +72,7 @@ def generate_jwt_token(config):
             headers=headers
         )
         
+        _TOKEN_CACHE[cache_key] = (token, payload['exp'])
         logger.info("JWT token生成成功")
         logger.debug(f"生成的JWT token: {token}")
         return token